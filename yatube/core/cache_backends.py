@@ -0,0 +1,316 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STAMP_KEY = 'two-tier:stamp'
+SEQ_KEY = 'two-tier:seq'
+TIERS = ('l1', 'l2', 'miss')
+# Столько записей журнала процесс дочитывает; отставший сильнее
+# сбрасывает первый уровень целиком.
+LOG_READ_LIMIT = 1000
+
+_MISSING = object()
+
+
+def stats_key(tier):
+    return f'two-tier:stats:{tier}'
+
+
+def log_key(seq):
+    return f'two-tier:log:{seq}'
+
+
+class LocalStore:
+    """Общий для всех потоков процесса LRU первого уровня."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.RLock()
+        self.origin = uuid.uuid4().hex
+        self.stamp = None
+        self.seq = None
+        self.checked_at = 0
+        self.stats = dict.fromkeys(TIERS, 0)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """Кеш из двух уровней: LRU в памяти процесса перед общим хранилищем.
+
+    LOCATION — псевдоним второго уровня в settings.CACHES (например,
+    файлового кеша, общего для всех воркеров узла). Первый уровень
+    ограничен числом записей (MAX_ENTRIES), объёмом (MAX_BYTES) и временем
+    жизни (L1_TIMEOUT).
+
+    Каждая запись во второй уровень (set, add, touch, delete и их
+    пакетные варианты) добавляет изменённые ключи в журнал во втором
+    уровне. incr в журнал не пишет: им сдвигаются счётчики статистики
+    на каждом запросе, и журнал переполнялся бы ими за секунды; значение
+    счётчика, прочитанное другим процессом, может отставать до
+    L1_TIMEOUT. Остальные процессы дочитывают журнал не чаще раза в
+    STAMP_INTERVAL секунд и выбрасывают из своего первого уровня только
+    эти ключи. Записи журнала живут LOG_TIMEOUT секунд: первый уровень
+    сбрасывается целиком лишь после clear или если процесс отстал от
+    журнала дальше, чем тот хранится.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._max_bytes = options.get('MAX_BYTES', 32 * 1024 * 1024)
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._stamp_interval = options.get('STAMP_INTERVAL', 1)
+        self._log_timeout = options.get('LOG_TIMEOUT', 30)
+        name = options.get('L1_NAME', location)
+        with _stores_lock:
+            self._store = _stores.setdefault(name, LocalStore())
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _sync(self):
+        store = self._store
+        now = time.monotonic()
+        if now - store.checked_at < self._stamp_interval:
+            return
+        found = self.l2.get_many([STAMP_KEY, SEQ_KEY])
+        stamp, seq = found.get(STAMP_KEY), found.get(SEQ_KEY, 0)
+        with store.lock:
+            known, stamp_changed = store.seq, stamp != store.stamp
+        log = None
+        if not stamp_changed and known is not None and known <= seq:
+            log = self._read_log(known, seq)
+        with store.lock:
+            store.checked_at = now
+            if log is None:
+                store.clear()
+            else:
+                changed, seq = log
+                for key in changed:
+                    self._l1_drop(key)
+            store.stamp, store.seq = stamp, seq
+            pending, store.stats = store.stats, dict.fromkeys(TIERS, 0)
+        for tier, count in pending.items():
+            if count:
+                self._add_stat(tier, count)
+
+    def _read_log(self, known, seq):
+        """Ключи, изменённые другими процессами после записи known, и
+        номер последней прочитанной записи.
+
+        Недописанные записи в конце журнала дочитываются в следующий
+        раз; None — часть журнала пропала, и первый уровень надо
+        сбросить целиком.
+        """
+        if seq - known > LOG_READ_LIMIT:
+            return None
+        numbers = range(known + 1, seq + 1)
+        entries = self.l2.get_many([log_key(number) for number in numbers])
+        changed, reached = [], known
+        for number in numbers:
+            entry = entries.get(log_key(number))
+            if entry is None:
+                break
+            origin, keys = entry
+            if origin != self._store.origin:
+                changed.extend(keys)
+            reached = number
+        if len(entries) > reached - known:
+            return None
+        return changed, reached
+
+    def _publish(self, keys):
+        """Записывает изменённые ключи в журнал для других процессов."""
+        try:
+            seq = self.l2.incr(SEQ_KEY)
+        except ValueError:
+            self.l2.add(SEQ_KEY, 0, None)
+            seq = self.l2.incr(SEQ_KEY)
+        self.l2.set(
+            log_key(seq), (self._store.origin, keys), self._log_timeout
+        )
+
+    def _add_stat(self, tier, count):
+        try:
+            self.l2.incr(stats_key(tier), count)
+        except ValueError:
+            self.l2.add(stats_key(tier), 0, None)
+            self.l2.incr(stats_key(tier), count)
+
+    def _record(self, tier, count=1):
+        with self._store.lock:
+            self._store.stats[tier] += count
+
+    def _bump_stamp(self):
+        stamp = uuid.uuid4().hex
+        self.l2.set(STAMP_KEY, stamp, None)
+        with self._store.lock:
+            self._store.stamp = stamp
+            self._store.seq = None
+
+    def _l1_get(self, key):
+        store = self._store
+        with store.lock:
+            entry = store.entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, data = entry
+            if expires is not None and expires <= time.time():
+                self._l1_drop(key)
+                return _MISSING
+            store.entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def _l1_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self._max_bytes:
+            return
+        expires = time.time() + self._l1_timeout
+        backend_expires = self.get_backend_timeout(timeout)
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        store = self._store
+        with store.lock:
+            self._l1_drop(key)
+            store.entries[key] = (expires, data)
+            store.size += len(data)
+            while (len(store.entries) > self._max_entries
+                   or store.size > self._max_bytes):
+                _, (_, evicted) = store.entries.popitem(last=False)
+                store.size -= len(evicted)
+
+    def _l1_drop(self, key):
+        store = self._store
+        with store.lock:
+            entry = store.entries.pop(key, None)
+            if entry is not None:
+                store.size -= len(entry[1])
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        value = self._l1_get(local_key)
+        if value is not _MISSING:
+            self._record('l1')
+            return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._record('miss')
+            return default
+        self._record('l2')
+        self._l1_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found, missing = {}, []
+        for key in keys:
+            value = self._l1_get(self.make_key(key, version=version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        self._record('l1', len(found))
+        if missing:
+            fetched = self.l2.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._l1_set(self.make_key(key, version=version), value)
+            found.update(fetched)
+            self._record('l2', len(fetched))
+            self._record('miss', len(missing) - len(fetched))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(local_key, value, timeout)
+        self._publish([local_key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version) or []
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(
+                    self.make_key(key, version=version), value, timeout
+                )
+        self._publish([self.make_key(key, version=version) for key in data])
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        if self.l2.add(key, value, timeout, version=version):
+            self._l1_set(local_key, value, timeout)
+            self._publish([local_key])
+            return True
+        self._l1_drop(local_key)
+        return False
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        self._l1_drop(local_key)
+        touched = self.l2.touch(key, timeout, version=version)
+        if touched:
+            self._publish([local_key])
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_key(key, version=version)
+        value = self.l2.incr(key, delta, version=version)
+        self._l1_drop(local_key)
+        return value
+
+    def has_key(self, key, version=None):
+        self._sync()
+        local_key = self.make_key(key, version=version)
+        if self._l1_get(local_key) is not _MISSING:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_key(key, version=version)
+        self.l2.delete(key, version=version)
+        self._l1_drop(local_key)
+        self._publish([local_key])
+
+    def delete_many(self, keys, version=None):
+        local_keys = [self.make_key(key, version=version) for key in keys]
+        if not local_keys:
+            return
+        self.l2.delete_many(keys, version=version)
+        for local_key in local_keys:
+            self._l1_drop(local_key)
+        self._publish(local_keys)
+
+    def clear(self):
+        self.l2.clear()
+        with self._store.lock:
+            self._store.clear()
+            self._store.stats = dict.fromkeys(TIERS, 0)
+        self._bump_stamp()
+
+    def tier_stats(self):
+        """Попадания по уровням (с учётом всех процессов) и их доли."""
+        self._store.checked_at = 0
+        self._sync()
+        found = self.l2.get_many([stats_key(tier) for tier in TIERS])
+        stats = {tier: found.get(stats_key(tier), 0) for tier in TIERS}
+        total = sum(stats.values())
+        for tier in TIERS:
+            stats[f'{tier}_ratio'] = stats[tier] / total if total else 0
+        return stats
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+TWO_TIER_BACKEND = 'core.cache_backends.TwoTierCache'
+# Эти кеши живут в памяти одного процесса: через них воркеры не узнают
+# об изменениях друг друга.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_tier(app_configs, **kwargs):
+    """Второй уровень TwoTierCache должен быть общим для воркеров."""
+    errors = []
+    for alias, config in settings.CACHES.items():
+        if config.get('BACKEND') != TWO_TIER_BACKEND:
+            continue
+        shared = settings.CACHES.get(config.get('LOCATION'), {})
+        if shared.get('BACKEND', PROCESS_LOCAL_BACKENDS[0]) in (
+            PROCESS_LOCAL_BACKENDS
+        ):
+            errors.append(Error(
+                f'Второй уровень кеша {alias!r} не общий для процессов: '
+                f'воркеры не увидят инвалидаций друг друга.',
+                hint='Укажите в CACHE_L2_BACKEND общий кеш, например '
+                     'файловый или memcached.',
+                id='core.E001',
+            ))
+    return errors
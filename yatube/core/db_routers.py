@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут в основную базу."""
+    depth = getattr(_state, 'primary', 0)
+    _state.primary = depth + 1
+    try:
+        yield
+    finally:
+        _state.primary = depth
+
+
+def reads_from_replica():
+    return (getattr(_state, 'replica', False)
+            and not getattr(_state, 'wrote', False)
+            and not getattr(_state, 'primary', 0))
+
+
+class ReplicaRouter:
+    """Чтения в запросах, которые пропустил ReplicaMiddleware, — в
+    случайную реплику из DATABASE_REPLICAS. Записи и всё, что читается
+    после записи в том же запросе, — в основную базу.
+
+    Вне запросов (миграции, команды, воркеры) реплики не используются.
+    Сессии всегда читаются из основной базы: только что созданной
+    сессии на реплике может ещё не быть.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (not replicas() or not reads_from_replica()
+                or model._meta.app_label == 'sessions'):
+            return PRIMARY
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: связи между ними допустимы.
+        return True
+
+
+class ReplicaMiddleware:
+    """Прилипание к основной базе: «прочитай свою запись».
+
+    Небезопасные методы целиком работают с основной базой. Если запрос
+    что-то записал, ответ ставит cookie, и следующие
+    DATABASE_REPLICA_LAG секунд запросы этого посетителя тоже читают из
+    основной базы — редирект после post_create уже покажет новый пост.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_sticky(self, request):
+        if request.method not in SAFE_METHODS:
+            return True
+        try:
+            until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            return False
+        return until > time.time()
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+        _state.wrote = False
+        _state.replica = not self.is_sticky(request)
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.wrote = _state.replica = False
+        if wrote:
+            lag = settings.DATABASE_REPLICA_LAG
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + lag),
+                max_age=lag, httponly=True, samesite='Lax'
+            )
+        return response
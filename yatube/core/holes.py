@@ -0,0 +1,26 @@
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+HOLE_PATTERN = re.compile(r'<!--hole:([A-Za-z0-9_\-=]+)-->')
+
+
+def hole_marker(template_name, params):
+    """Метка на месте персонального фрагмента в общей копии страницы."""
+    raw = json.dumps({'template': template_name, 'params': params})
+    return mark_safe('<!--hole:{}-->'.format(
+        base64.urlsafe_b64encode(raw.encode()).decode()
+    ))
+
+
+def render_hole(match, request):
+    spec = json.loads(base64.urlsafe_b64decode(match.group(1)).decode())
+    return render_to_string(spec['template'], spec['params'], request)
+
+
+def fill_holes(content, request):
+    """Подставляет в общую копию страницы фрагменты текущего пользователя."""
+    return HOLE_PATTERN.sub(lambda match: render_hole(match, request), content)
@@ -0,0 +1,142 @@
+import logging
+import random
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Столько запросов одной формы за запрос к сайту уже похоже на N+1.
+REPEAT_LIMIT = 3
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+WRITE = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление сделало больше запросов, чем ему разрешено."""
+
+
+def query_budget(limit, repeats=REPEAT_LIMIT):
+    """Объявляет, сколько SQL-запросов может сделать представление
+    и сколько раз в нём допустим запрос одной формы."""
+    def decorator(view):
+        view.query_budget = (limit, repeats)
+        return view
+    return decorator
+
+
+def query_shape(sql):
+    """SQL без конкретных значений: запросы одной формы отличаются
+    только параметрами."""
+    return NUMBER.sub('?', IN_LIST.sub('IN (...)', sql))
+
+
+class QueryReport:
+    """Запросы, сделанные при обработке одного запроса к сайту."""
+
+    def __init__(self):
+        self.queries = []
+        self.view_name = None
+        self.budget = None
+        self.wrote = False
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        if WRITE.match(sql):
+            self.wrote = True
+        return execute(sql, params, many, context)
+
+    def record(self):
+        """Подключается ко всем базам на время блока with."""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self):
+        """Формы запросов, повторившиеся больше допустимого."""
+        _, repeats = self.budget or (None, REPEAT_LIMIT)
+        return {
+            shape: times
+            for shape, times in Counter(map(query_shape, self.queries)).items()
+            if times > repeats
+        }
+
+    def problems(self):
+        problems = []
+        if self.budget is not None and self.count > self.budget[0]:
+            problems.append(
+                f'{self.view_name}: {self.count} SQL-запросов '
+                f'при бюджете {self.budget[0]}'
+            )
+        for shape, times in self.repeated().items():
+            problems.append(
+                f'{self.view_name}: запрос повторён {times} раз '
+                f'(похоже на N+1): {shape}'
+            )
+        return problems
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого представления и сверяет их с бюджетом
+    из @query_budget.
+
+    Запросы записываются при DEBUG, а без него — у доли
+    QUERY_BUDGET_SAMPLE запросов к сайту (0 — ни у одного). Превышение и
+    повторяющиеся запросы пишутся в лог, а при QUERY_BUDGET_STRICT = True
+    в настройках — поднимают исключение, если представление ничего не
+    записало: записанное уже зафиксировано, и ошибка вместо ответа
+    только заставила бы повторить запрос. Отчёт доступен в
+    response.query_report, у незаписанных запросов — None.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def sampled(self):
+        return settings.DEBUG or random.random() < getattr(
+            settings, 'QUERY_BUDGET_SAMPLE', 0
+        )
+
+    def __call__(self, request):
+        if not self.sampled():
+            response = self.get_response(request)
+            response.query_report = None
+            return response
+        report = QueryReport()
+        with report.record():
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None:
+            report.view_name = match.view_name
+            report.budget = getattr(match.func, 'query_budget', None)
+        response.query_report = report
+        problems = report.problems() if report.view_name else []
+        for problem in problems:
+            logger.warning(problem)
+        strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        if problems and strict and not report.wrote:
+            raise QueryBudgetExceeded('; '.join(problems))
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Проверки бюджета запросов для TestCase."""
+
+    def assertWithinQueryBudget(self, response):
+        report = response.query_report
+        self.assertIsNotNone(report, 'Запросы не записаны: задайте '
+                             'QUERY_BUDGET_SAMPLE = 1 в настройках теста')
+        self.assertIsNotNone(
+            report.budget, f'У {report.view_name} не объявлен бюджет запросов'
+        )
+        self.assertEqual(report.problems(), [], '\n'.join(report.queries))
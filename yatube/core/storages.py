@@ -0,0 +1,59 @@
+import hashlib
+import os
+import threading
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_name(name, digest):
+    """Имя файла по хешу содержимого: posts/ab/cd/abcd….gif.
+
+    Два уровня каталогов по 256 штук держат каталоги небольшими даже при
+    миллионах файлов; каталог и расширение берутся из исходного имени.
+    """
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(
+        directory, digest[:2], digest[2:4], f'{digest}{extension}'
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, где имя файла — sha256 его содержимого.
+
+    Повторная загрузка того же файла не пишет его снова, а возвращает имя
+    уже сохранённого: одинаковые картинки разных постов — один файл.
+    Удалять такие файлы можно, только когда на них никто не ссылается.
+    """
+
+    # Имя, которое сейчас пишет _save этого потока.
+    _writing = threading.local()
+
+    def get_available_name(self, name, max_length=None):
+        # FileSystemStorage._save просит новое имя, если файл появился
+        # между exists() и записью: его записала параллельная загрузка
+        # того же содержимого. Исключение выходит из _save наружу.
+        if name == getattr(self._writing, 'name', None):
+            raise FileExistsError(name)
+        # Имя всё равно заменяется хешем в _save.
+        return name
+
+    def _save(self, name, content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        name = content_name(name, sha256.hexdigest())
+        if not self.exists(name):
+            self._writing.name = name
+            try:
+                return super()._save(name, content)
+            except FileExistsError:
+                pass
+            finally:
+                self._writing.name = None
+        # Свежий mtime защищает файл от сборщика мусора, пока новая
+        # ссылка на него ещё не сохранена.
+        os.utime(self.path(name))
+        return name
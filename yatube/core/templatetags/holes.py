@@ -0,0 +1,21 @@
+from django import template
+from django.template.loader import render_to_string
+
+from core.holes import hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **params):
+    """Фрагмент, зависящий от пользователя.
+
+    Обычно рендерится на месте, как include. Если страница кешируется
+    для всех посетителей сразу (request.punch_holes), вместо фрагмента
+    ставится метка, которую заполняют отдельно для каждого запроса.
+    """
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return hole_marker(template_name, params)
+    with context.push(**params):
+        return render_to_string(template_name, context.flatten(), request)
@@ -0,0 +1,119 @@
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from core.cache_backends import TwoTierCache
+from core.checks import check_shared_tier
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'l2': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': TEMP_CACHE_DIR,
+    },
+})
+class TwoTierCacheTests(SimpleTestCase):
+    def worker(self, name, **options):
+        """Отдельный LRU первого уровня — как в другом процессе."""
+        options.setdefault('STAMP_INTERVAL', 0)
+        return TwoTierCache('l2', {'OPTIONS': {'L1_NAME': name, **options}})
+
+    def setUp(self):
+        self.worker('cleaner').clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def test_value_is_shared_and_invalidated_across_workers(self):
+        """Второй уровень общий, а delete сбрасывает чужой первый уровень"""
+        first, second = self.worker('first'), self.worker('second')
+        first.set('key', 'value')
+        self.assertEqual(second.get('key'), 'value')
+        self.assertEqual(second.get('key'), 'value')
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+        stats = second.tier_stats()
+        self.assertEqual((stats['l1'], stats['l2'], stats['miss']), (1, 1, 1))
+
+    def test_writes_invalidate_only_changed_keys_elsewhere(self):
+        """Перезапись и delete выбрасывают из чужого первого уровня только
+        изменённые ключи, а счётчики (incr) журнал не засоряют"""
+        first, second = self.worker('writer'), self.worker('reader')
+        first.set_many({'kept': 1, 'changed': 1})
+        self.assertEqual(
+            second.get_many(['kept', 'changed']), {'kept': 1, 'changed': 1}
+        )
+        first.set('changed', 2)
+        self.assertEqual(second.get('changed'), 2)
+        seq = first.l2.get('two-tier:seq')
+        first.add('counter', 0)
+        first.incr('counter')
+        first.incr('counter')
+        self.assertEqual(first.l2.get('two-tier:seq'), seq + 1)
+        self.assertEqual(first.l2.get('counter'), 2)
+        first.delete('changed')
+        self.assertIsNone(second.get('changed'))
+        self.assertIn(second.make_key('kept'), second._store.entries)
+
+    def test_lagging_worker_drops_local_tier(self):
+        """Отставший от журнала процесс сбрасывает первый уровень целиком"""
+        first, second = self.worker('writer'), self.worker('lagging')
+        first.set('key', 'value')
+        second.get('key')
+        first.set('key', 'new')
+        first.l2.delete('two-tier:log:2')
+        first.set('other', 'value')
+        self.assertEqual(second.get('key'), 'new')
+
+    def test_local_tier_is_bounded(self):
+        """Первый уровень вытесняет давно не читанные записи"""
+        worker = self.worker('bounded', MAX_ENTRIES=2)
+        worker.set_many({'a': 1, 'b': 2})
+        worker.get('a')
+        worker.set('c', 3)
+        self.assertEqual(
+            list(worker._store.entries),
+            [worker.make_key('a'), worker.make_key('c')]
+        )
+        self.assertEqual(worker.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2, 'c': 3})
+
+    def test_cached_objects_are_not_shared_by_reference(self):
+        """Изменение прочитанного объекта не меняет значение в кеше"""
+        worker = self.worker('copies')
+        worker.set('list', [1])
+        worker.get('list').append(2)
+        self.assertEqual(worker.get('list'), [1])
+
+
+class SharedTierCheckTests(SimpleTestCase):
+    def test_process_local_second_tier_fails_check(self):
+        """Второй уровень в памяти процесса не проходит проверку"""
+        caches = {
+            'default': {
+                'BACKEND': 'core.cache_backends.TwoTierCache',
+                'LOCATION': 'shared',
+            },
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+        }
+        with override_settings(CACHES=caches):
+            self.assertEqual(
+                [error.id for error in check_shared_tier(None)],
+                ['core.E001']
+            )
+        caches['shared'] = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': TEMP_CACHE_DIR,
+        }
+        with override_settings(CACHES=caches):
+            self.assertEqual(check_shared_tier(None), [])
@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.db_routers import STICKY_COOKIE, ReplicaMiddleware, primary_reads
+from posts.models import Post
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], DATABASE_REPLICA_LAG=5)
+class ReplicaRouterTests(SimpleTestCase):
+    def request(self, method='get', write=False, cookie=None):
+        """Прогоняет запрос через middleware и возвращает базы, из
+        которых view читал до и после записи, и ответ."""
+        reads = []
+
+        def view(request):
+            reads.append(router.db_for_read(Post))
+            if write:
+                router.db_for_write(Post)
+            with primary_reads():
+                self.assertEqual(router.db_for_read(Post), 'default')
+            self.assertEqual(router.db_for_read(Session), 'default')
+            reads.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        if cookie is not None:
+            request.COOKIES[STICKY_COOKIE] = cookie
+        response = ReplicaMiddleware(view)(request)
+        return reads, response
+
+    def test_reads_go_to_replica_until_user_writes(self):
+        """Чтения идут в реплику, записи и всё после них — в основную
+        базу, а cookie держит посетителя на ней DATABASE_REPLICA_LAG;
+        сессии и чтения для долгих кешей — всегда из основной базы"""
+        reads, response = self.request()
+        self.assertEqual(reads, ['replica_1', 'replica_1'])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        reads, response = self.request(write=True)
+        self.assertEqual(reads, ['replica_1', 'default'])
+        sticky = response.cookies[STICKY_COOKIE]
+        self.assertEqual(sticky['max-age'], 5)
+
+        reads, _ = self.request(cookie=sticky.value)
+        self.assertEqual(reads, ['default', 'default'])
+        reads, _ = self.request(cookie=str(time.time() - 1))
+        self.assertEqual(reads, ['replica_1', 'replica_1'])
+        reads, _ = self.request(method='post')
+        self.assertEqual(reads, ['default', 'default'])
+        # Вне запросов (миграции, команды) — только основная база.
+        self.assertEqual(router.db_for_read(Post), 'default')
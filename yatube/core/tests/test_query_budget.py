@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.query_budget import (QueryBudgetExceeded, QueryBudgetMiddleware,
+                               query_budget)
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, QUERY_BUDGET_SAMPLE=1)
+class QueryBudgetMiddlewareTests(TestCase):
+    def request(self, write=False):
+        """Прогоняет через middleware представление, которое превышает
+        нулевой бюджет чтением, а при write — ещё и записью."""
+        @query_budget(0)
+        def view(request):
+            User.objects.count()
+            if write:
+                User.objects.create_user(username='author')
+            return HttpResponse()
+
+        def get_response(request):
+            request.resolver_match = mock.Mock(view_name='view', func=view)
+            return view(request)
+
+        return QueryBudgetMiddleware(get_response)(RequestFactory().get('/'))
+
+    def test_strict_mode_raises_only_without_writes(self):
+        """Строгий режим отказывает чтению сверх бюджета, а запрос,
+        который уже записал данные, только пишет в лог"""
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.request()
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            response = self.request(write=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.filter(username='author').exists())
+
+    @override_settings(QUERY_BUDGET_SAMPLE=0)
+    def test_queries_are_recorded_only_for_sample(self):
+        """Без DEBUG запросы считаются только у выборки запросов"""
+        response = self.request()
+        self.assertIsNone(response.query_report)
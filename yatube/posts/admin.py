@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
-from .models import Comment, Follow, Group, Post
+from .models import Comment, Follow, Group, Post, Tag
+from .search import match_sql
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,8 +12,18 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо icontains по всей таблице.
+        match = match_sql(search_term)
+        if match is None:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=RawSQL(*match)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
 admin.site.register(Follow)
 admin.site.register(Comment)
+admin.site.register(Tag)
@@ -0,0 +1,330 @@
+import hashlib
+import math
+import random
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+from core.db_routers import primary_reads
+from core.holes import fill_holes
+
+from .constants import (FEED_CACHE_TIMEOUT, FEED_EARLY_EXPIRY_BETA,
+                        FEED_LOCK_POLL, FEED_LOCK_TIMEOUT, FEED_LOCK_WAIT,
+                        FEED_STALE_TIMEOUT, POST_CARD_TIMEOUT)
+from .models import Post
+from .objects import is_missing
+
+CACHE_EVENTS = ('hit', 'stale', 'miss', 'invalidation')
+
+
+def generation_key(feed):
+    return f'feed-generation:{feed}'
+
+
+def stats_key(event):
+    return f'feed-cache-stats:{event}'
+
+
+def count_event(event, delta=1):
+    key = stats_key(event)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def cache_stats():
+    """Счётчики попаданий, промахов и инвалидаций кеша страниц лент."""
+    found = cache.get_many([stats_key(event) for event in CACHE_EVENTS])
+    return {
+        event: found.get(stats_key(event), 0) for event in CACHE_EVENTS
+    }
+
+
+def new_generation():
+    # Поколение — текущее время, а не счётчик с единицы: удалённый или
+    # вытесненный ключ поколения не может вернуть старые страницы.
+    return time.time_ns()
+
+
+def feed_generations(feeds):
+    """Текущие поколения лент; недостающие начинаются заново."""
+    keys = [generation_key(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, new_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def feed_version(feeds):
+    """Версия набора лент: меняется при любой инвалидации любой из них."""
+    return '.'.join(str(generation) for generation in feed_generations(feeds))
+
+
+def changed_recently(feeds):
+    """Ленты менялись не раньше DATABASE_REPLICA_LAG секунд назад:
+    реплика могла ещё не получить изменения.
+
+    Поколение начинается не раньше изменения ленты, так что молодое
+    поколение — верный признак недавней записи.
+    """
+    newest = max(feed_generations(feeds)) / 10**9
+    return time.time() - newest < settings.DATABASE_REPLICA_LAG
+
+
+def invalidate(feeds):
+    """Удаляет поколения лент: их закешированные страницы становятся
+    недоступны, а следующее чтение начнёт новое поколение."""
+    feeds = set(feeds)
+    cache.delete_many([generation_key(feed) for feed in feeds])
+    count_event('invalidation', len(feeds))
+
+
+def versioned_feed(feeds):
+    """Имя ленты вместе с версией — для ключей производных кешей."""
+    return f'{",".join(feeds)}@{feed_version(feeds)}'
+
+
+def user_key(request):
+    return request.user.pk if request.user.is_authenticated else 'anon'
+
+
+def page_cache_key(request, feeds):
+    # Пользователя в ключе нет: персональные фрагменты вырезаны из копии
+    # страницы, а ленты подписок и так свои у каждого по имени ленты.
+    raw = f'{",".join(feeds)}|{request.get_full_path()}'
+    return 'feed-page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def is_fresh(entry, version):
+    """Запись актуальна, если поколение совпадает и срок не истёк.
+
+    Срок проверяется с вероятностным опережением (XFetch): чем дольше
+    страница считалась и чем ближе конец срока, тем вероятнее, что один из
+    запросов пересчитает её заранее, — пересчёты не совпадают по времени.
+    """
+    if entry is None or entry['version'] != version:
+        return False
+    early = entry['delta'] * FEED_EARLY_EXPIRY_BETA * -math.log(
+        1 - random.random()
+    )
+    return time.time() + early < entry['expires']
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def acquire_lock(key):
+    """Токен взятой блокировки пересчёта или None, если её держит
+    другой запрос."""
+    token = uuid.uuid4().hex
+    if cache.add(lock_key(key), token, FEED_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    # Снимается только своя блокировка: если наша истекла и её взял
+    # другой запрос, его блокировка остаётся.
+    if cache.get(lock_key(key)) == token:
+        cache.delete(lock_key(key))
+
+
+def wait_for_entry(key, version):
+    deadline = time.monotonic() + FEED_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(FEED_LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            return entry
+    return None
+
+
+def feed_validators(feeds_for, holes_for=None):
+    """ETag и Last-Modified страницы ленты без запросов к базе.
+
+    ETag — версия лент и пользователь (у каждого свои фрагменты страницы),
+    Last-Modified — время самого свежего поколения: оно начинается не
+    раньше последнего изменения ленты.
+
+    holes_for(request, *args, **kwargs) возвращает ленты общих для всех
+    фрагментов страницы: в копию страницы они не входят, но ответ 304
+    должен устаревать и вместе с ними.
+    """
+    def validated_feeds(request, *args, **kwargs):
+        feeds = tuple(feeds_for(request, *args, **kwargs))
+        if holes_for is not None:
+            feeds += tuple(holes_for(request, *args, **kwargs))
+        return feeds
+
+    def etag(request, *args, **kwargs):
+        version = feed_version(validated_feeds(request, *args, **kwargs))
+        return f'{version}-{user_key(request)}'
+
+    def last_modified(request, *args, **kwargs):
+        generations = feed_generations(
+            validated_feeds(request, *args, **kwargs)
+        )
+        return datetime.fromtimestamp(max(generations) / 10**9, timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def post_state(request, post_id):
+    """Версия поста, число и время последнего комментария — одним
+    запросом по первичному ключу и индексу комментариев поста."""
+    if not hasattr(request, '_post_state'):
+        if is_missing(Post, post_id):
+            request._post_state = None
+            return None
+        request._post_state = Post.objects.filter(pk=post_id).annotate(
+            last_comment=Max('comments__created')
+        ).values_list(
+            'updated', 'comments_count', 'last_comment',
+            'author__counters__posts_count'
+        ).first()
+    return request._post_state
+
+
+def post_etag(request, post_id):
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    updated, comments_count, last_comment, posts_count = state
+    last_comment = last_comment.timestamp() if last_comment else 0
+    return (f'{updated.timestamp()}-{comments_count}-{last_comment}-'
+            f'{posts_count}-{user_key(request)}')
+
+
+def post_last_modified(request, post_id):
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    updated, _, last_comment, _ = state
+    return max(filter(None, (updated, last_comment)))
+
+
+post_validators = condition(
+    etag_func=post_etag, last_modified_func=post_last_modified
+)
+
+
+def personalize(response, request):
+    """Заполняет вырезанные фрагменты копии страницы для этого запроса."""
+    response.content = fill_holes(
+        response.content.decode(response.charset), request
+    )
+    return response
+
+
+def cache_feed(feeds_for, timeout=FEED_CACHE_TIMEOUT, holes_for=None):
+    """Кеширует страницу ленты вместе с поколениями её лент.
+
+    feeds_for(request, *args, **kwargs) возвращает имена лент, от которых
+    зависит страница; сигналы моделей сдвигают их поколения, поэтому
+    страницы можно держать в кеше часами без риска показать устаревшее.
+
+    Устаревшую страницу пересчитывает один запрос, взявший блокировку;
+    остальные тем временем получают прежнюю копию, а если её нет — ждут
+    до FEED_LOCK_WAIT секунд готовую страницу и, не дождавшись, считают
+    её сами, не трогая чужую блокировку.
+
+    Копия страницы одна на всех посетителей: при пересчёте view рендерится
+    с request.punch_holes, теги {% hole %} оставляют в ней метки, а перед
+    отдачей метки заполняются фрагментами текущего пользователя.
+
+    На условные запросы с неизменившимися лентами отвечает 304, не
+    заглядывая в кеш страниц; ленты фрагментов из holes_for входят только
+    в валидаторы.
+    """
+    def decorator(view):
+        @feed_validators(feeds_for, holes_for)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            feeds = feeds_for(request, *args, **kwargs)
+            key = page_cache_key(request, feeds)
+            version = feed_version(feeds)
+            entry = cache.get(key)
+            if is_fresh(entry, version):
+                count_event('hit')
+                return personalize(entry['response'], request)
+            token = acquire_lock(key)
+            if token is None:
+                if entry is not None:
+                    count_event('stale')
+                    return personalize(entry['response'], request)
+                entry = wait_for_entry(key, version)
+                if entry is not None:
+                    count_event('hit')
+                    return personalize(entry['response'], request)
+            count_event('miss')
+            try:
+                started = time.time()
+                request.punch_holes = True
+                # Копия живёт часами: сразу после записи её строят
+                # по основной базе, а не по отстающей реплике.
+                reads = (primary_reads() if changed_recently(feeds)
+                         else nullcontext())
+                with reads:
+                    response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies:
+                    finished = time.time()
+                    cache.set(key, {
+                        'version': version,
+                        'response': response,
+                        'delta': finished - started,
+                        'expires': finished + timeout,
+                    }, timeout + FEED_STALE_TIMEOUT)
+            finally:
+                request.punch_holes = False
+                if token is not None:
+                    release_lock(key, token)
+            return personalize(response, request)
+        return wrapper
+    return decorator
+
+
+def card_key(post):
+    # Карточка показывает автора и группу поста: их переименование не
+    # меняет post.updated, поэтому их состояние тоже входит в ключ.
+    group = post.group
+    state = post.author.username
+    if group is not None:
+        state += f'|{group.slug}|{group.title}'
+    digest = hashlib.md5(state.encode()).hexdigest()
+    return f'post-card:{post.pk}:{post.updated.timestamp()}:{digest}'
+
+
+def render_cards(posts):
+    """Карточки постов: один get_many на страницу, рендерятся только
+    отсутствующие в кеше (варианты их картинок — одним запросом)."""
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    found = cache.get_many(keys)
+    missing = [post for post, key in zip(posts, keys) if key not in found]
+    prefetch_related_objects(missing, 'image_variants')
+    rendered = {
+        card_key(post): render_to_string(
+            'includes/article.html', {'post': post}
+        )
+        for post in missing
+    }
+    if rendered:
+        cache.set_many(rendered, POST_CARD_TIMEOUT)
+    found.update(rendered)
+    return [(post, mark_safe(found[key])) for post, key in zip(posts, keys)]
@@ -1,3 +1,41 @@
 NUM_OF_CHAR = 15
 POSTS_PER_PAGE = 10
-NUMBER_OF_SECONDS = 20
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+PAGINATOR_WINDOW = 3
+FEED_COUNT_TIMEOUT = 60 * 60
+COUNT_ESTIMATE_THRESHOLD = 100000
+TIMELINE_LENGTH = 1000
+TIMELINE_BATCH_SIZE = 500
+FANOUT_FOLLOWER_THRESHOLD = 10000
+RECOUNT_CHUNK_SIZE = 1000
+POST_CARD_TIMEOUT = 60 * 60 * 24
+FEED_STALE_TIMEOUT = 60 * 10
+FEED_LOCK_TIMEOUT = 10
+FEED_LOCK_WAIT = 2
+FEED_LOCK_POLL = 0.05
+FEED_EARLY_EXPIRY_BETA = 1.0
+POST_IMAGE_GEOMETRY = '960x339'
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+POST_IMAGE_WIDTHS = (320, 640, 960)
+# Порядок — по предпочтению; форматы без кодека в Pillow пропускаются.
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP')
+POST_IMAGE_QUALITY = 80
+THUMBNAIL_BATCH_SIZE = 50
+THUMBNAIL_POLL_INTERVAL = 2
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_JPEG_QUALITY = 85
+MEDIA_GC_BATCH_SIZE = 500
+MEDIA_GC_PAUSE = 0.5
+MEDIA_GC_GRACE = 60 * 60 * 24
+SEARCH_CONFIG = 'russian'
+SEARCH_MAX_TERMS = 10
+TAG_MAX_LENGTH = 50
+TRENDING_DAYS = 7
+TRENDING_TAGS_LIMIT = 10
+TRENDING_CACHE_TIMEOUT = 60 * 5
+COMMENTS_PER_PAGE = 20
+POST_PREVIEW_LENGTH = 300
+OBJECT_CACHE_TIMEOUT = 60 * 60
+OBJECT_MISS_TIMEOUT = 60 * 5
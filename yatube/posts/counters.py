@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F
+
+from .constants import RECOUNT_CHUNK_SIZE
+from .models import (Comment, Follow, Group, Post, PostTag, Tag,
+                     UserCounters)
+
+User = get_user_model()
+
+
+def bump(queryset, **deltas):
+    """Атомарно сдвигает счётчики в строках queryset на заданные величины."""
+    queryset.update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def chunked_ids(queryset, chunk_size):
+    """Первичные ключи queryset порциями, без OFFSET и серверных курсоров."""
+    last_pk = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', flat=True
+            )[:chunk_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def count_by(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values_list(field, 'total')
+    )
+
+
+def recount_users(chunk_size=RECOUNT_CHUNK_SIZE):
+    fields = (
+        'posts_count', 'comments_count', 'followers_count', 'following_count'
+    )
+    for ids in chunked_ids(User.objects.all(), chunk_size):
+        totals = {
+            'posts_count': count_by(Post.objects, 'author_id', ids),
+            'comments_count': count_by(Comment.objects, 'author_id', ids),
+            'followers_count': count_by(Follow.objects, 'author_id', ids),
+            'following_count': count_by(Follow.objects, 'user_id', ids),
+        }
+        UserCounters.objects.bulk_create(
+            [UserCounters(user_id=user_id) for user_id in ids],
+            ignore_conflicts=True
+        )
+        counters = list(UserCounters.objects.filter(user_id__in=ids))
+        for counter in counters:
+            for field in fields:
+                setattr(counter, field, totals[field].get(counter.user_id, 0))
+        UserCounters.objects.bulk_update(counters, fields)
+        yield len(ids)
+
+
+def recount_posts(chunk_size=RECOUNT_CHUNK_SIZE):
+    for ids in chunked_ids(Post.objects.all(), chunk_size):
+        totals = count_by(Comment.objects, 'post_id', ids)
+        posts = list(Post.objects.filter(pk__in=ids).only('comments_count'))
+        for post in posts:
+            post.comments_count = totals.get(post.pk, 0)
+        Post.objects.bulk_update(posts, ('comments_count',))
+        yield len(ids)
+
+
+def recount_groups(chunk_size=RECOUNT_CHUNK_SIZE):
+    for ids in chunked_ids(Group.objects.all(), chunk_size):
+        totals = count_by(Post.objects, 'group_id', ids)
+        groups = list(Group.objects.filter(pk__in=ids).only('posts_count'))
+        for group in groups:
+            group.posts_count = totals.get(group.pk, 0)
+        Group.objects.bulk_update(groups, ('posts_count',))
+        yield len(ids)
+
+
+def recount_tags(chunk_size=RECOUNT_CHUNK_SIZE):
+    for ids in chunked_ids(Tag.objects.all(), chunk_size):
+        totals = count_by(PostTag.objects, 'tag_id', ids)
+        tags = list(Tag.objects.filter(pk__in=ids).only('posts_count'))
+        for tag in tags:
+            tag.posts_count = totals.get(tag.pk, 0)
+        Tag.objects.bulk_update(tags, ('posts_count',))
+        yield len(ids)
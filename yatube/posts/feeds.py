@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+
+from .models import Follow, Group, PulledAuthor, Tag
+from .timelines import post_readers
+
+User = get_user_model()
+
+INDEX_FEED = 'index'
+PULLED_FEED = 'follow-pulled'
+TRENDING_FEED = 'trending'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def profile_feed(username):
+    return f'profile:{username}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def tag_feed(name):
+    return f'tag:{name.lower()}'
+
+
+def follow_feeds(user_id):
+    """Лента подписок зависит и от своей ленты, и от постов авторов,
+    читаемых по запросу: их посты не раскладываются по подписчикам."""
+    return (follow_feed(user_id), PULLED_FEED)
+
+
+def feeds_of_post(post, readers=None):
+    """Ленты, в которых показывается пост; readers — уже найденный
+    post_readers автора."""
+    feeds = [INDEX_FEED, profile_feed(post.author.username)]
+    if post.group_id:
+        feeds.append(group_feed(post.group.slug))
+    feeds.extend(
+        tag_feed(name)
+        for name in post.post_tags.values_list('tag__name', flat=True)
+    )
+    pulled, followers = readers or post_readers(post.author_id)
+    if pulled:
+        feeds.append(PULLED_FEED)
+        return feeds
+    feeds.extend(follow_feed(user_id) for user_id in followers)
+    return feeds
+
+
+def feeds_of_posts(posts):
+    """Ленты, в которых показываются посты queryset posts, — для правок,
+    задевающих их все сразу (смена имени автора или адреса группы)."""
+    feeds = {INDEX_FEED}
+    feeds.update(map(profile_feed, User.objects.filter(
+        posts__in=posts
+    ).values_list('username', flat=True).distinct()))
+    feeds.update(map(group_feed, Group.objects.filter(
+        posts__in=posts
+    ).values_list('slug', flat=True).distinct()))
+    feeds.update(map(tag_feed, Tag.objects.filter(
+        post_tags__post__in=posts
+    ).values_list('name', flat=True).distinct()))
+    feeds.update(map(follow_feed, Follow.objects.filter(
+        author__posts__in=posts
+    ).values_list('user_id', flat=True).distinct()))
+    if PulledAuthor.objects.filter(author__posts__in=posts).exists():
+        feeds.add(PULLED_FEED)
+    return feeds
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.exceptions import ValidationError
 
 from .models import Post, Comment
+from .uploads import check_upload_size, prepare_image
 
 
 class PostForm(forms.ModelForm):
@@ -18,6 +20,37 @@ class PostForm(forms.ModelForm):
                 'Можно, кстати, не указывать'
         }
 
+    def save(self, commit=True):
+        """Правка поста пишет только поля формы и производные от них.
+
+        Счётчики поста меняются F()-выражениями параллельно с правкой, а
+        миниатюру пишет воркер: сохранение всех полей загруженного
+        объекта откатило бы эти изменения.
+        """
+        if not commit or self.instance.pk is None:
+            return super().save(commit)
+        fields = [*self._meta.fields, 'preview', 'updated']
+        if 'image' in self.changed_data:
+            fields.extend(('thumbnail', 'thumbnail_failed'))
+        post = super().save(commit=False)
+        post.save(update_fields=fields)
+        self._save_m2m()
+        return post
+
+    def clean_image(self):
+        return prepare_image(self.cleaned_data.get('image'))
+
+    def clean(self):
+        # Обрезанный при загрузке файл ImageField считает битой картинкой;
+        # показываем настоящую причину.
+        upload = self.files.get(self.add_prefix('image'))
+        try:
+            check_upload_size(upload)
+        except ValidationError as error:
+            self.errors.pop('image', None)
+            self.add_error('image', error)
+        return super().clean()
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
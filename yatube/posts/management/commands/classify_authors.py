@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.constants import FANOUT_FOLLOWER_THRESHOLD
+from posts.models import PulledAuthor, UserCounters
+from posts.timelines import set_pulled
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит авторов с числом подписчиков не меньше порога на чтение '
+        'при запросе, а остальных — на раздачу постов по лентам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=int,
+            default=FANOUT_FOLLOWER_THRESHOLD,
+            help='Число подписчиков, начиная с которого посты не раздаются.'
+        )
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        heavy = set(
+            UserCounters.objects.filter(
+                followers_count__gte=threshold
+            ).values_list('user_id', flat=True)
+        )
+        pulled = set(PulledAuthor.objects.values_list('author_id', flat=True))
+        for author_id in heavy - pulled:
+            with transaction.atomic():
+                set_pulled(author_id, True)
+        for author_id in pulled - heavy:
+            with transaction.atomic():
+                set_pulled(author_id, False)
+        self.stdout.write(
+            f'Читаются по запросу: {len(heavy - pulled)} новых, '
+            f'возвращены к раздаче: {len(pulled - heavy)}, '
+            f'всего по запросу: {len(heavy)}.'
+        )
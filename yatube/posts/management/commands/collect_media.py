@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+from posts.constants import MEDIA_GC_BATCH_SIZE, MEDIA_GC_GRACE, MEDIA_GC_PAUSE
+from posts.media import collect_keys, collect_media
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки и миниатюры, на которые больше не ссылается '
+        'ни один пост, и записи хранилища ключей sorl об отсутствующих '
+        'файлах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=MEDIA_GC_BATCH_SIZE,
+            help=(
+                'Сколько файлов, записей MediaBlob или ключей sorl '
+                'проверять за запрос.'
+            )
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=MEDIA_GC_PAUSE,
+            help='Пауза в секундах после каждой порции удалений.'
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=MEDIA_GC_GRACE,
+            help='Не трогать файлы моложе стольких секунд.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено.'
+        )
+
+    def handle(self, *args, **options):
+        report = collect_media(
+            options['batch_size'], options['pause'], options['grace'],
+            dry_run=options['dry_run']
+        )
+        verb = 'можно удалить' if options['dry_run'] else 'удалено'
+        for directory, stats in report.items():
+            self.stdout.write(
+                f'{directory}/: просмотрено {stats["files"]} файлов, '
+                f'{verb} {stats["orphans"]} '
+                f'({stats["bytes"]} байт).'
+            )
+        keys = collect_keys(
+            options['batch_size'], options['pause'],
+            dry_run=options['dry_run']
+        )
+        self.stdout.write(
+            f'хранилище ключей sorl: просмотрено {keys["keys"]} записей, '
+            f'{verb} {keys["stale"]} устаревших.'
+        )
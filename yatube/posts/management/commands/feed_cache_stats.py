@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from django.core.cache import cache
+
+from posts.caching import cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания, промахи и инвалидации кеша страниц лент.'
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        served = stats['hit'] + stats['stale']
+        requests = served + stats['miss']
+        ratio = served / requests if requests else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hit"]}, устаревших копий: {stats["stale"]}, '
+            f'промахов: {stats["miss"]} ({ratio:.1%} из кеша), '
+            f'инвалидаций: {stats["invalidation"]}.'
+        )
+        tier_stats = getattr(cache, 'tier_stats', None)
+        if tier_stats is not None:
+            tiers = tier_stats()
+            self.stdout.write(
+                f'Уровни кеша: L1 {tiers["l1"]} ({tiers["l1_ratio"]:.1%}), '
+                f'L2 {tiers["l2"]} ({tiers["l2_ratio"]:.1%}), '
+                f'промахи {tiers["miss"]} ({tiers["miss_ratio"]:.1%}).'
+            )
@@ -0,0 +1,77 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+from posts.caching import cache_stats, invalidate
+from posts.feeds import INDEX_FEED
+
+
+class Command(BaseCommand):
+    help = (
+        'Параллельно запрашивает страницу ленты и показывает задержки и '
+        'число пересчётов: при защите от лавины их не больше, чем '
+        'инвалидаций.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов на один поток.')
+        parser.add_argument(
+            '--invalidate-interval',
+            type=float,
+            default=0.5,
+            help='Как часто (в секундах) сбрасывать ленту index; 0 — никогда.'
+        )
+
+    def run_client(self, options, latencies):
+        client = Client(HTTP_HOST=options['host'])
+        try:
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                client.get(options['url'])
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    def invalidate_periodically(self, interval, stop):
+        while not stop.wait(interval):
+            invalidate([INDEX_FEED])
+
+    def handle(self, *args, **options):
+        before = cache_stats()
+        latencies = []
+        stop = threading.Event()
+        if options['invalidate_interval'] > 0:
+            threading.Thread(
+                target=self.invalidate_periodically,
+                args=(options['invalidate_interval'], stop),
+                daemon=True
+            ).start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['threads']) as pool:
+            for _ in range(options['threads']):
+                pool.submit(self.run_client, options, latencies)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        after = cache_stats()
+        latencies.sort()
+        median = statistics.median(latencies) * 1000
+        delta = {event: after[event] - before[event] for event in after}
+        self.stdout.write(
+            f'Запросов: {len(latencies)} за {elapsed:.2f} с '
+            f'({len(latencies) / elapsed:.0f} в секунду).\n'
+            f'Задержка, мс: медиана {median:.1f}, '
+            f'95% {latencies[int(len(latencies) * 0.95)] * 1000:.1f}, '
+            f'максимум {latencies[-1] * 1000:.1f}.\n'
+            f'Из кеша: {delta["hit"]}, устаревшая копия: {delta["stale"]}, '
+            f'пересчётов: {delta["miss"]}, '
+            f'инвалидаций: {delta["invalidation"]}.'
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import variant_savings
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько трафика экономят варианты картинок '
+        'по сравнению с миниатюрой 960x339.'
+    )
+
+    def handle(self, *args, **options):
+        report = variant_savings()
+        if not report:
+            self.stdout.write('Вариантов картинок пока нет.')
+            return
+        for (image_format, width), row in report.items():
+            saving = 1 - row['bytes'] / row['baseline']
+            self.stdout.write(
+                f'{image_format} {width}w: {row["count"]} шт., '
+                f'{row["bytes"]} байт вместо {row["baseline"]} '
+                f'(экономия {saving:.1%}).'
+            )
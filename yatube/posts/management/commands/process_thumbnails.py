@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.constants import THUMBNAIL_BATCH_SIZE, THUMBNAIL_POLL_INTERVAL
+from posts.thumbnails import generate_thumbnails, retry_failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Фоновый воркер: рисует миниатюры загруженных картинок, '
+        'чтобы запросы страниц не тратили на это время.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=THUMBNAIL_BATCH_SIZE,
+            help='Сколько постов брать из очереди за один проход.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=THUMBNAIL_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и выйти.'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Вернуть в очередь картинки, которые не удалось обработать.'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f'Возвращено в очередь: {retry_failed()}.')
+        while True:
+            done = generate_thumbnails(options['batch_size'])
+            if done:
+                self.stdout.write(f'Готово миниатюр: {done}.')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.constants import RECOUNT_CHUNK_SIZE
+from posts.counters import (recount_groups, recount_posts, recount_tags,
+                            recount_users)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев, подписок и тегов '
+        'порциями, исправляя расхождения с данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RECOUNT_CHUNK_SIZE,
+            help='Сколько строк пересчитывать за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for name, recount in (
+            ('пользователей', recount_users),
+            ('постов', recount_posts),
+            ('групп', recount_groups),
+            ('тегов', recount_tags),
+        ):
+            total = sum(recount(chunk_size))
+            self.stdout.write(f'Пересчитано {name}: {total}.')
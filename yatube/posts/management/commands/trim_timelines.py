@@ -0,0 +1,34 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from posts.constants import TIMELINE_BATCH_SIZE
+from posts.timelines import long_timelines, trim_timelines
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрезает ленты подписок, выросшие больше TIMELINE_LENGTH записей. '
+        'Запускается периодически, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TIMELINE_BATCH_SIZE,
+            help='Сколько лент обрезать одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        readers = iter(list(long_timelines()))
+        trimmed = removed = 0
+        while True:
+            batch = list(islice(readers, options['batch_size']))
+            if not batch:
+                break
+            trimmed += len(batch)
+            removed += trim_timelines(batch)
+        self.stdout.write(
+            f'Обрезано лент: {trimmed}, удалено записей: {removed}.'
+        )
@@ -0,0 +1,232 @@
+import os
+import posixpath
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from sorl.thumbnail import default as thumbnail_default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import ImageVariant, MediaBlob, Post
+
+
+def media_directories():
+    """Каталоги MEDIA_ROOT, куда пишут посты: оригиналы и миниатюры."""
+    return (
+        Post._meta.get_field('image').upload_to.strip('/'),
+        thumbnail_settings.THUMBNAIL_PREFIX.strip('/'),
+    )
+
+
+def walk_files(directory):
+    """Файлы каталога MEDIA_ROOT рекурсивно: (имя, размер, mtime).
+
+    os.scandir отдаёт записи по одной, поэтому каталог с миллионами
+    файлов не читается в память целиком.
+    """
+    path = os.path.join(settings.MEDIA_ROOT, directory)
+    if not os.path.isdir(path):
+        return
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = posixpath.join(directory, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(name)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                yield name, stat.st_size, stat.st_mtime
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def referenced(names):
+    """Имена из names, на которые ссылаются посты или варианты картинок.
+
+    Оригиналы с записью в MediaBlob тоже считаются занятыми: их удаляет
+    collect_blobs по счётчику ссылок.
+    """
+    return (
+        set(Post.objects.filter(image__in=names).values_list(
+            'image', flat=True))
+        | set(MediaBlob.objects.filter(name__in=names).values_list(
+            'name', flat=True))
+        | set(Post.objects.filter(thumbnail__in=names).values_list(
+            'thumbnail', flat=True))
+        | set(ImageVariant.objects.filter(file__in=names).values_list(
+            'file', flat=True))
+    )
+
+
+def forget(name):
+    """Удаляет файл и записи о нём в хранилище ключей sorl."""
+    image_storage = Post._meta.get_field('image').storage
+    for storage in (image_storage, default_storage):
+        thumbnail_default.kvstore.delete(
+            ImageFile(name, storage), delete_thumbnails=False
+        )
+    default_storage.delete(name)
+
+
+def file_stat(name):
+    """Размер и mtime файла MEDIA_ROOT; (0, 0) — если файла уже нет."""
+    try:
+        stat = os.stat(os.path.join(settings.MEDIA_ROOT, name))
+    except FileNotFoundError:
+        return 0, 0
+    return stat.st_size, stat.st_mtime
+
+
+def collect_blobs(stats, batch_size, pause, grace, dry_run):
+    """Удаляет оригиналы, счётчик ссылок которых в MediaBlob дошёл до нуля.
+
+    Строки выбираются по индексу updated: менявшиеся последние grace
+    секунд ждут, как и файлы со свежим mtime — их могли только что
+    загрузить снова. Посты с такой картинкой проверяются ещё раз по
+    индексу Post.image на случай, если счётчик разошёлся с данными.
+    """
+    deadline = time.time() - grace
+    blobs = MediaBlob.objects.filter(
+        refs__lte=0, updated__lt=timezone.now() - timedelta(seconds=grace)
+    ).order_by('pk')
+    last = 0
+    while True:
+        chunk = list(
+            blobs.filter(pk__gt=last).values_list('pk', 'name')[:batch_size]
+        )
+        if not chunk:
+            return
+        last = chunk[-1][0]
+        used = set(Post.objects.filter(
+            image__in=[name for _, name in chunk]
+        ).values_list('image', flat=True))
+        orphans = []
+        for pk, name in chunk:
+            size, mtime = file_stat(name)
+            if name not in used and mtime < deadline:
+                orphans.append((pk, name))
+                stats['bytes'] += size
+        stats['orphans'] += len(orphans)
+        if dry_run or not orphans:
+            continue
+        for _, name in orphans:
+            forget(name)
+        MediaBlob.objects.filter(
+            pk__in=[pk for pk, _ in orphans], refs__lte=0
+        ).delete()
+        time.sleep(pause)
+
+
+def collect_media(batch_size, pause, grace, dry_run=False):
+    """Находит и удаляет файлы MEDIA_ROOT, на которые никто не ссылается.
+
+    Сначала collect_blobs удаляет оригиналы по счётчикам MediaBlob. Затем
+    каталоги просматриваются порциями по batch_size в поисках файлов без
+    записей в MediaBlob — миниатюр, вариантов и загрузок, пост которых
+    так и не сохранился: для каждой порции четыре запроса по индексам
+    решают, какие файлы ещё нужны. Файлы моложе grace секунд не
+    трогаются. Между порциями удалений — пауза pause секунд.
+
+    Возвращает {каталог: {'files', 'orphans', 'bytes'}}.
+    """
+    deadline = time.time() - grace
+    originals, thumbnails = media_directories()
+    report = {
+        directory: {'files': 0, 'orphans': 0, 'bytes': 0}
+        for directory in (originals, thumbnails)
+    }
+    collect_blobs(report[originals], batch_size, pause, grace, dry_run)
+    for directory, stats in report.items():
+        for chunk in chunks(walk_files(directory), batch_size):
+            stats['files'] += len(chunk)
+            used = referenced([name for name, _, _ in chunk])
+            orphans = [
+                (name, size) for name, size, mtime in chunk
+                if name not in used and mtime < deadline
+            ]
+            stats['orphans'] += len(orphans)
+            stats['bytes'] += sum(size for _, size in orphans)
+            if dry_run or not orphans:
+                continue
+            for name, _ in orphans:
+                forget(name)
+            time.sleep(pause)
+    return report
+
+
+def kvstore_rows(identity, batch_size):
+    """Строки хранилища ключей sorl одного вида порциями по batch_size.
+
+    Порции выбираются по первичному ключу после последнего прочитанного:
+    таблица не читается в память целиком, а удаления между порциями не
+    сдвигают следующие.
+    """
+    rows = KVStore.objects.filter(
+        key__startswith=add_prefix('', identity)
+    ).order_by('key')
+    last = ''
+    while True:
+        chunk = list(
+            rows.filter(key__gt=last).values_list('key', 'value')[:batch_size]
+        )
+        if not chunk:
+            return
+        last = chunk[-1][0]
+        yield chunk
+
+
+def collect_keys(batch_size, pause, dry_run=False):
+    """Удаляет записи хранилища ключей sorl о файлах, которых больше нет.
+
+    Замена kvstore.cleanup(), который читает все ключи разом: записи
+    картинок проверяются порциями по batch_size и удаляются вместе с их
+    миниатюрами, затем порциями же удаляются списки миниатюр, оставшиеся
+    без записи картинки. Между порциями удалений — пауза pause секунд.
+
+    Возвращает {'keys', 'stale'}: сколько записей просмотрено и сколько
+    из них устарело.
+    """
+    kvstore = thumbnail_default.kvstore
+    stats = {'keys': 0, 'stale': 0}
+    for chunk in kvstore_rows('image', batch_size):
+        stats['keys'] += len(chunk)
+        stale = [
+            image_file for image_file in (
+                deserialize_image_file(value) for _, value in chunk
+            )
+            if not image_file.exists()
+        ]
+        stats['stale'] += len(stale)
+        if dry_run or not stale:
+            continue
+        for image_file in stale:
+            kvstore.delete(image_file)
+        time.sleep(pause)
+    for chunk in kvstore_rows('thumbnails', batch_size):
+        stats['keys'] += len(chunk)
+        image_keys = {key: add_prefix(del_prefix(key)) for key, _ in chunk}
+        present = set(KVStore.objects.filter(
+            key__in=image_keys.values()
+        ).values_list('key', flat=True))
+        loose = [
+            key for key, image_key in image_keys.items()
+            if image_key not in present
+        ]
+        stats['stale'] += len(loose)
+        if dry_run or not loose:
+            continue
+        kvstore._delete_raw(*loose)
+        time.sleep(pause)
+    return stats
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_auto_20261018_0616'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PulledAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pulled', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Автор, читаемый по запросу',
+                'verbose_name_plural': 'Авторы, читаемые по запросу',
+            },
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CHUNK_SIZE = 1000
+
+
+def chunked_ids(queryset):
+    last_pk = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', flat=True
+            )[:CHUNK_SIZE]
+        )
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def count_by(queryset, field, ids):
+    # Один агрегат на связь: COUNT по нескольким JOIN сразу
+    # перемножал бы строки.
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by().values(
+            field
+        ).annotate(total=models.Count('pk')).values_list(field, 'total')
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    for ids in chunked_ids(User.objects.all()):
+        posts = count_by(Post.objects, 'author_id', ids)
+        comments = count_by(Comment.objects, 'author_id', ids)
+        followers = count_by(Follow.objects, 'author_id', ids)
+        following = count_by(Follow.objects, 'user_id', ids)
+        UserCounters.objects.bulk_create(
+            UserCounters(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                comments_count=comments.get(user_id, 0),
+                followers_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            ) for user_id in ids
+        )
+    for ids in chunked_ids(Post.objects.all()):
+        totals = count_by(Comment.objects, 'post_id', ids)
+        Post.objects.bulk_update(
+            [Post(pk=pk, comments_count=total)
+             for pk, total in totals.items()],
+            ('comments_count',)
+        )
+    for ids in chunked_ids(Group.objects.all()):
+        totals = count_by(Post.objects, 'group_id', ids)
+        Group.objects.bulk_update(
+            [Group(pk=pk, posts_count=total)
+             for pk, total in totals.items()],
+            ('posts_count',)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_pulledauthor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Число постов')),
+                ('comments_count', models.IntegerField(default=0, verbose_name='Число комментариев')),
+                ('followers_count', models.IntegerField(db_index=True, default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Число подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, help_text='Заполняется фоновым воркером process_thumbnails', upload_to='', verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('file', models.ImageField(editable=False, upload_to='', verbose_name='Файл')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер, байт')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_variants', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Вариант картинки',
+                'verbose_name_plural': 'Варианты картинок',
+                'ordering': ('width',),
+                'unique_together': {('post', 'format', 'width')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:39
+
+import core.storages
+from django.db import migrations, models
+
+
+def fill_blobs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    images = Post.objects.exclude(image='').values('image').annotate(
+        total=models.Count('pk')
+    ).order_by()
+    MediaBlob.objects.bulk_create(
+        MediaBlob(name=row['image'], refs=row['total'])
+        for row in images.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_imagevariant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('refs', models.IntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storages.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:52
+
+from django.db import migrations
+
+# DDL и наполнение индекса зафиксированы здесь, а не берутся из
+# posts.search: миграция должна применяться одинаково, как бы ни менялся
+# модуль поиска.
+SEARCH_TABLE = 'posts_post_search'
+SEARCH_CONFIG = 'russian'
+
+CREATE_INDEX = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+        f"text, tokenize='unicode61 remove_diacritics 2')",
+        f'INSERT INTO {SEARCH_TABLE} (rowid, text) '
+        f'SELECT id, text FROM posts_post',
+    ],
+    'postgresql': [
+        f'CREATE TABLE {SEARCH_TABLE} ('
+        f'post_id integer PRIMARY KEY REFERENCES posts_post(id) '
+        f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        f'document tsvector NOT NULL)',
+        f"INSERT INTO {SEARCH_TABLE} (post_id, document) "
+        f"SELECT id, to_tsvector('{SEARCH_CONFIG}'::regconfig, text) "
+        f"FROM posts_post",
+        f'CREATE INDEX {SEARCH_TABLE}_document_idx '
+        f'ON {SEARCH_TABLE} USING GIN (document)',
+    ],
+}
+DROP_INDEX = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+
+
+def create_search_index(apps, schema_editor):
+    for sql in CREATE_INDEX.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_INDEX:
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_mediablob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,157 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+from collections import Counter
+
+TAG_MAX_LENGTH = 50
+TAG_PATTERN = re.compile(r'(?<![\w#])#(\w+)')
+MENTION_PATTERN = re.compile(r'(?<![\w@])@([\w.@+-]+)')
+
+
+def extract_tags(text):
+    # Копия posts.tags.extract_tags на момент миграции.
+    return {
+        name.lower() for name in TAG_PATTERN.findall(text)
+        if len(name) <= TAG_MAX_LENGTH
+    }
+
+
+def extract_mentions(text):
+    # Копия posts.tags.extract_mentions на момент миграции.
+    return {name.rstrip('.') for name in MENTION_PATTERN.findall(text)}
+
+
+def fill_tags(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Tag = apps.get_model('posts', 'Tag')
+    PostTag = apps.get_model('posts', 'PostTag')
+    TagTrend = apps.get_model('posts', 'TagTrend')
+    Mention = apps.get_model('posts', 'Mention')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    tagged, mentioned = [], []
+    for pk, text, pub_date in Post.objects.values_list(
+        'pk', 'text', 'pub_date'
+    ).iterator():
+        tagged.extend((pk, name, pub_date) for name in extract_tags(text))
+        mentioned.extend(
+            (pk, name, pub_date) for name in extract_mentions(text)
+        )
+    totals = Counter(name for _, name, _ in tagged)
+    Tag.objects.bulk_create(
+        [Tag(name=name, posts_count=total) for name, total in totals.items()]
+    )
+    tag_ids = dict(Tag.objects.values_list('name', 'pk'))
+    PostTag.objects.bulk_create(
+        [PostTag(post_id=pk, tag_id=tag_ids[name], pub_date=pub_date)
+         for pk, name, pub_date in tagged],
+        batch_size=500
+    )
+    trends = Counter(
+        (tag_ids[name], pub_date.date()) for _, name, pub_date in tagged
+    )
+    TagTrend.objects.bulk_create(
+        [TagTrend(tag_id=tag_id, day=day, posts_count=total)
+         for (tag_id, day), total in trends.items()],
+        batch_size=500
+    )
+    user_ids = dict(User.objects.filter(
+        username__in={name for _, name, _ in mentioned}
+    ).values_list('username', 'pk'))
+    Mention.objects.bulk_create(
+        [Mention(post_id=pk, user_id=user_ids[name], pub_date=pub_date)
+         for pk, name, pub_date in mentioned if name in user_ids],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Тег')),
+                ('posts_count', models.IntegerField(db_index=True, default=0, editable=False, verbose_name='Число постов')),
+            ],
+            options={
+                'verbose_name': 'Тег',
+                'verbose_name_plural': 'Теги',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='TagTrend',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Число постов')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trends', to='posts.Tag', verbose_name='Тег')),
+            ],
+            options={
+                'verbose_name': 'Тег за день',
+                'verbose_name_plural': 'Теги по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.Post', verbose_name='Пост')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.Tag', verbose_name='Тег')),
+            ],
+            options={
+                'verbose_name': 'Тег поста',
+                'verbose_name_plural': 'Теги постов',
+                'ordering': ('-pub_date', '-post'),
+            },
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL, verbose_name='Упомянутый пользователь')),
+            ],
+            options={
+                'verbose_name': 'Упоминание',
+                'verbose_name_plural': 'Упоминания',
+                'ordering': ('-pub_date', '-post'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tagtrend',
+            index=models.Index(fields=['day'], name='posts_tagtrend_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tagtrend',
+            unique_together={('tag', 'day')},
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-pub_date', '-post'], name='posts_posttag_tag_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posttag',
+            unique_together={('tag', 'post')},
+        ),
+        migrations.AddIndex(
+            model_name='mention',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='posts_mention_user_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='mention',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_tags, migrations.RunPython.noop),
+    ]
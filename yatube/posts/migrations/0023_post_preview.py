@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:52
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+PREVIEW_LENGTH = 300
+
+
+def fill_previews(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = []
+    for post in Post.objects.only('text').iterator():
+        post.preview = Truncator(post.text).chars(PREVIEW_LENGTH)
+        posts.append(post)
+        if len(posts) == 500:
+            Post.objects.bulk_update(posts, ('preview',))
+            posts = []
+    Post.objects.bulk_update(posts, ('preview',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_comment_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, help_text='Заполняется при сохранении поста', max_length=300, verbose_name='Начало текста'),
+        ),
+        migrations.RunPython(fill_previews, migrations.RunPython.noop),
+    ]
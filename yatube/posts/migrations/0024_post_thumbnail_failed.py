@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+def requeue_fallbacks(apps, schema_editor):
+    # Раньше при ошибке миниатюрой становился оригинал: такие посты
+    # снова идут в очередь и при повторной ошибке помечаются.
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(image='').filter(
+        thumbnail=models.F('image')
+    ).update(thumbnail='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_post_preview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail_failed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюру не удалось нарисовать'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('thumbnail', ''), ('thumbnail_failed', False), models.Q(_negated=True, image='')), fields=['-pub_date'], name='posts_post_pending_thumb_idx'),
+        ),
+        migrations.RunPython(requeue_fallbacks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:19
+
+import core.storages
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_post_thumbnail_failed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=core.storages.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_post_image_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagevariant',
+            name='file',
+            field=models.ImageField(db_index=True, editable=False, upload_to='', verbose_name='Файл'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='thumbnail',
+            field=models.ImageField(blank=True, db_index=True, editable=False, help_text='Заполняется фоновым воркером process_thumbnails', upload_to='', verbose_name='Миниатюра'),
+        ),
+    ]
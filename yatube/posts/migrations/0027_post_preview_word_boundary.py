@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:40
+
+import re
+
+from django.db import migrations
+from django.db.models.functions import Length
+
+PREVIEW_LENGTH = 300
+CHUNK_SIZE = 500
+
+
+def make_preview(text):
+    # Копия Post.make_preview на момент миграции.
+    cut = text[:PREVIEW_LENGTH - 1]
+    if not text[len(cut)].isspace():
+        cut = re.sub(r'\S+$', '', cut) or cut
+    return cut.rstrip() + '…'
+
+
+def recut_previews(apps, schema_editor):
+    # Превью, обрезанные посреди слова, обрезаются заново по его границе.
+    Post = apps.get_model('posts', 'Post')
+    long_posts = Post.objects.annotate(
+        length=Length('text')
+    ).filter(length__gt=PREVIEW_LENGTH).only('text')
+    posts = []
+    for post in long_posts.iterator():
+        post.preview = make_preview(post.text)
+        posts.append(post)
+        if len(posts) == CHUNK_SIZE:
+            Post.objects.bulk_update(posts, ('preview',))
+            posts = []
+    Post.objects.bulk_update(posts, ('preview',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_media_file_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(recut_previews, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,43 @@
+import re
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
-from .constants import NUM_OF_CHAR
+from core.storages import ContentAddressedStorage
+
+from .constants import (NUM_OF_CHAR, POST_IMAGE_FORMATS, POST_PREVIEW_LENGTH,
+                        TAG_MAX_LENGTH)
 
 User = get_user_model()
 
+# Поля поста, которые нужны карточке в ленте.
+CARD_FIELDS = (
+    'preview', 'pub_date', 'updated', 'image', 'thumbnail',
+    'thumbnail_failed', 'author__username', 'group__slug', 'group__title',
+)
+
 
 class Group(models.Model):
     title = models.CharField(verbose_name='Имя', max_length=200)
     slug = models.SlugField(verbose_name='Адрес', max_length=50, unique=True)
     description = models.TextField(verbose_name='Описание')
+    posts_count = models.IntegerField(
+        verbose_name='Число постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def cards(self):
+        """Посты для карточек лент: автор и группа тем же запросом,
+        вместо полного текста — сохранённое начало."""
+        return self.select_related('author', 'group').only(*CARD_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -25,6 +48,10 @@ class Post(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -43,17 +70,84 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True
+    )
+    thumbnail = models.ImageField(
+        'Миниатюра',
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text='Заполняется фоновым воркером process_thumbnails'
+    )
+    thumbnail_failed = models.BooleanField(
+        'Миниатюру не удалось нарисовать',
+        default=False,
+        editable=False
     )
+    comments_count = models.IntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False
+    )
+    preview = models.CharField(
+        verbose_name='Начало текста',
+        max_length=POST_PREVIEW_LENGTH,
+        blank=True,
+        editable=False,
+        help_text='Заполняется при сохранении поста'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            # Очередь process_thumbnails: в индексе только её посты.
+            models.Index(
+                fields=('-pub_date',),
+                name='posts_post_pending_thumb_idx',
+                condition=(
+                    models.Q(thumbnail='', thumbnail_failed=False)
+                    & ~models.Q(image='')
+                )
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:NUM_OF_CHAR]
 
+    @staticmethod
+    def make_preview(text):
+        """Начало текста не длиннее POST_PREVIEW_LENGTH, обрезанное по
+        границе слова: от #кошки не остаётся ссылки на тег #кош."""
+        if len(text) <= POST_PREVIEW_LENGTH:
+            return text
+        cut = text[:POST_PREVIEW_LENGTH - 1]
+        if not text[len(cut)].isspace():
+            # Одно слово длиннее превью режется как есть.
+            cut = re.sub(r'\S+$', '', cut) or cut
+        return cut.rstrip() + '…'
+
+    def image_sources(self):
+        """Источники для <picture>: [(mime, srcset)], лучший формат первым.
+
+        Рассчитано на prefetch_related('image_variants').
+        """
+        sources = {}
+        for variant in self.image_variants.all():
+            sources.setdefault(variant.format, []).append(
+                f'{variant.file.url} {variant.width}w'
+            )
+        return [
+            (f'image/{image_format.lower()}', ', '.join(sources[image_format]))
+            for image_format in POST_IMAGE_FORMATS
+            if image_format in sources
+        ]
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -82,6 +176,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='posts_comment_post_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Под постом {self.post} добавлен комментарий'
@@ -108,3 +208,239 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user.username} подписался на {self.author.username}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='posts_timeline_user_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user.username}'
+
+
+class PulledAuthor(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='pulled',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Автор, читаемый по запросу'
+        verbose_name_plural = 'Авторы, читаемые по запросу'
+
+    def __str__(self):
+        return self.author.username
+
+
+class UserCounters(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.IntegerField(
+        verbose_name='Число постов',
+        default=0
+    )
+    comments_count = models.IntegerField(
+        verbose_name='Число комментариев',
+        default=0
+    )
+    followers_count = models.IntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        db_index=True
+    )
+    following_count = models.IntegerField(
+        verbose_name='Число подписок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'Счётчики {self.user.username}'
+
+
+class ImageVariant(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Пост'
+    )
+    format = models.CharField(verbose_name='Формат', max_length=10)
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    file = models.ImageField(
+        verbose_name='Файл',
+        editable=False,
+        db_index=True
+    )
+    size = models.PositiveIntegerField(verbose_name='Размер, байт')
+
+    class Meta:
+        ordering = ('width',)
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        unique_together = ('post', 'format', 'width')
+
+    def __str__(self):
+        return f'{self.post} в {self.format} шириной {self.width}'
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(
+        verbose_name='Файл',
+        max_length=255,
+        unique=True
+    )
+    refs = models.IntegerField(verbose_name='Число ссылок', default=0)
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
+
+
+class Tag(models.Model):
+    name = models.CharField(
+        verbose_name='Тег',
+        max_length=TAG_MAX_LENGTH,
+        unique=True
+    )
+    posts_count = models.IntegerField(
+        verbose_name='Число постов',
+        default=0,
+        editable=False,
+        db_index=True
+    )
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name='Пост'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name='Тег'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name = 'Тег поста'
+        verbose_name_plural = 'Теги постов'
+        unique_together = ('tag', 'post')
+        indexes = [
+            models.Index(
+                fields=('tag', '-pub_date', '-post'),
+                name='posts_posttag_tag_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post} с тегом {self.tag}'
+
+
+class TagTrend(models.Model):
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='trends',
+        verbose_name='Тег'
+    )
+    day = models.DateField(verbose_name='День')
+    posts_count = models.IntegerField(
+        verbose_name='Число постов',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Тег за день'
+        verbose_name_plural = 'Теги по дням'
+        unique_together = ('tag', 'day')
+        indexes = [
+            models.Index(fields=('day',), name='posts_tagtrend_day_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.tag} за {self.day}: {self.posts_count}'
+
+
+class Mention(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        verbose_name='Пост'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        verbose_name='Упомянутый пользователь'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name = 'Упоминание'
+        verbose_name_plural = 'Упоминания'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='posts_mention_user_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} упомянут в {self.post}'
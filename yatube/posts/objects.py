@@ -0,0 +1,76 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404
+
+from core.db_routers import primary_reads
+
+from .constants import (OBJECT_CACHE_TIMEOUT, OBJECT_MISS_TIMEOUT,
+                        RECOUNT_CHUNK_SIZE)
+from .counters import chunked_ids
+from .models import Group, Post
+
+User = get_user_model()
+
+# Метка «такого объекта нет»: кешируется вместо объекта на 404.
+MISSING = 'object-cache:missing'
+
+
+def lookup_field(model):
+    """Поле, по которому представления ищут объекты модели."""
+    return {Post: 'pk', Group: 'slug', User: 'username'}[model]
+
+
+def lookup_queryset(model):
+    if model is Post:
+        return Post.objects.select_related('author', 'group')
+    return model.objects.all()
+
+
+def object_key(model, value):
+    # Значение из адреса может быть любым: в ключ идёт его хеш.
+    digest = hashlib.md5(str(value).encode()).hexdigest()
+    return f'object:{model._meta.label_lower}:{digest}'
+
+
+def is_missing(model, value):
+    """Объект уже искали и не нашли — в базу можно не ходить."""
+    return cache.get(object_key(model, value)) == MISSING
+
+
+def get_cached_or_404(model, value):
+    """Объект по ключевому полю — из кеша или из базы с записью в кеш.
+
+    Промах тоже кешируется (на OBJECT_MISS_TIMEOUT), так что перебор
+    несуществующих адресов не доходит до базы. Сигналы сбрасывают
+    записи при изменении объектов.
+    """
+    key = object_key(model, value)
+    obj = cache.get(key)
+    if obj is None:
+        # Запись кеша живёт долго — читаем её из основной базы.
+        with primary_reads():
+            obj = lookup_queryset(model).filter(
+                **{lookup_field(model): value}
+            ).first()
+        if obj is None:
+            cache.set(key, MISSING, OBJECT_MISS_TIMEOUT)
+        else:
+            cache.set(key, obj, OBJECT_CACHE_TIMEOUT)
+    if obj is None or obj == MISSING:
+        raise Http404(f'{model._meta.object_name} не найден')
+    return obj
+
+
+def forget(model, *values):
+    """Сбрасывает записи кеша объектов (и промахов) по ключам."""
+    keys = [object_key(model, value) for value in values if value is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+def forget_posts(queryset):
+    """Сбрасывает посты queryset: в их записях лежат автор и группа."""
+    for ids in chunked_ids(queryset, RECOUNT_CHUNK_SIZE):
+        forget(Post, *ids)
@@ -0,0 +1,190 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .constants import (COUNT_ESTIMATE_THRESHOLD, FEED_COUNT_TIMEOUT,
+                        PAGINATOR_WINDOW)
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(obj, direction, field='pub_date'):
+    """Кодирует ключ (field, id) объекта в непрозрачный токен."""
+    raw = f'{direction}{getattr(obj, field).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (direction, время, id) или None для битого токена."""
+    try:
+        padding = '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        direction, key = raw[0], raw[1:]
+        pub_date, pk = key.rsplit('|', 1)
+        if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+            return None
+        return direction, datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, IndexError, ValueError):
+        return None
+
+
+def older_rows(queryset, token, per_page, field='created'):
+    """Строки по убыванию (field, id), следующие за курсором, и курсор
+    к ещё более старым (None на последней порции).
+
+    Только вперёд и без COUNT(*): так подгружаются комментарии.
+    """
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    cursor = decode_cursor(token) if token else None
+    if cursor is not None and cursor[0] == CURSOR_NEXT:
+        _, value, pk = cursor
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+        )
+    rows = list(queryset[:per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, encode_cursor(rows[-1], CURSOR_NEXT, field)
+
+
+def count_cache_key(feed):
+    return f'feed-count:{feed}'
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по плану PostgreSQL; для прочих СУБД — None."""
+    query = getattr(queryset, 'query', None)
+    if query is None:
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPage(Page):
+    """Страница, выбранная по курсору: без OFFSET и без COUNT(*)."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self.page_window = range(0)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Page by cursor>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class WindowPaginator(Paginator):
+    """Пагинатор, который отдаёт в шаблон только окно номеров страниц
+    вокруг текущей."""
+
+    def get_page_window(self, number):
+        """Номера страниц не дальше PAGINATOR_WINDOW от текущей."""
+        first = max(1, number - PAGINATOR_WINDOW)
+        last = min(self.num_pages, number + PAGINATOR_WINDOW)
+        return range(first, last + 1)
+
+    def _get_page(self, object_list, number, paginator):
+        page = super()._get_page(list(object_list), number, paginator)
+        page.page_window = self.get_page_window(number)
+        page.previous_cursor = page.next_cursor = None
+        return page
+
+
+class FeedPaginator(WindowPaginator):
+    """Пагинатор ленты постов с ключом (pub_date, id).
+
+    Номера страниц (?page=) работают как раньше, а ссылки «вперёд» и
+    «назад» строятся по курсору (?cursor=), так что глубокие страницы
+    обходятся так же дёшево, как первая.
+
+    Число постов ленты ``feed`` хранится в кеше (сигналы сбрасывают его
+    при добавлении и удалении постов), для огромных таблиц PostgreSQL
+    берётся оценка планировщика, а в шаблон попадает только окно номеров
+    страниц вокруг текущей.
+    """
+    ordering = ('-pub_date', '-pk')
+
+    def __init__(self, object_list, per_page, feed=None, **kwargs):
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+        self.feed = feed
+
+    @cached_property
+    def count(self):
+        if self.feed is None:
+            return super().count
+        key = count_cache_key(self.feed)
+        count = cache.get(key)
+        if count is None:
+            count = estimate_count(self.object_list)
+            if count is None or count < COUNT_ESTIMATE_THRESHOLD:
+                count = super().count
+            cache.set(key, count, FEED_COUNT_TIMEOUT)
+        return count
+
+    def _get_page(self, object_list, number, paginator):
+        page = super()._get_page(object_list, number, paginator)
+        self._set_cursors(page)
+        return page
+
+    def _set_cursors(self, page):
+        page.previous_cursor = page.next_cursor = None
+        if page.object_list and page.has_previous():
+            page.previous_cursor = encode_cursor(
+                page.object_list[0], CURSOR_PREVIOUS
+            )
+        if page.object_list and page.has_next():
+            page.next_cursor = encode_cursor(
+                page.object_list[-1], CURSOR_NEXT
+            )
+
+    def get_page_by_cursor(self, token):
+        """Страница после (или до) курсора; битый курсор — первая страница."""
+        cursor = decode_cursor(token)
+        if cursor is None:
+            return self.get_page(1)
+        direction, pub_date, pk = cursor
+        if direction == CURSOR_NEXT:
+            rows = self.object_list.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        else:
+            rows = self.object_list.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            ).order_by('pub_date', 'pk')
+        rows = list(rows[:self.per_page + 1])
+        if not rows:
+            return self.get_page(1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == CURSOR_NEXT:
+            page = CursorPage(rows, self, has_more, True)
+        else:
+            rows.reverse()
+            page = CursorPage(rows, self, True, has_more)
+        self._set_cursors(page)
+        return page
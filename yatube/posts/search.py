@@ -0,0 +1,137 @@
+import re
+
+from django.db import connection, connections, router
+
+from .constants import SEARCH_CONFIG, SEARCH_MAX_TERMS
+from .models import Post
+
+SEARCH_TABLE = 'posts_post_search'
+WORD = re.compile(r'\w+')
+
+# Полнотекстовый индекс живёт в отдельной таблице: FTS5 на SQLite,
+# tsvector с GIN-индексом на PostgreSQL. Для прочих СУБД поиск идёт
+# через icontains. Таблицу и индекс создаёт миграция 0020_post_search.
+UPSERT = {
+    'sqlite': [
+        f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+        f'INSERT INTO {SEARCH_TABLE} (rowid, text) VALUES (%s, %s)',
+    ],
+    'postgresql': [
+        f'INSERT INTO {SEARCH_TABLE} (post_id, document) '
+        f'VALUES (%s, to_tsvector(%s::regconfig, %s)) '
+        f'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+    ],
+}
+DELETE = {
+    'sqlite': f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+    'postgresql': f'DELETE FROM {SEARCH_TABLE} WHERE post_id = %s',
+}
+MATCH = {
+    'sqlite': (
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    ),
+    'postgresql': (
+        f'SELECT post_id FROM {SEARCH_TABLE} '
+        f'WHERE document @@ plainto_tsquery(%s::regconfig, %s)'
+    ),
+}
+RANKED = {
+    'sqlite': (
+        MATCH['sqlite'] + ' ORDER BY rank, rowid DESC LIMIT %s OFFSET %s'
+    ),
+    'postgresql': (
+        MATCH['postgresql'] + ' ORDER BY ts_rank(document, '
+        'plainto_tsquery(%s::regconfig, %s)) DESC, post_id DESC '
+        'LIMIT %s OFFSET %s'
+    ),
+}
+
+
+def search_terms(query):
+    return WORD.findall(query.lower())[:SEARCH_MAX_TERMS]
+
+
+def match_params(vendor, terms):
+    if vendor == 'sqlite':
+        # Каждое слово в кавычках — синтаксис FTS5 из запроса не проходит;
+        # звёздочка ищет по началу слова, заменяя отсутствующий стемминг.
+        return [' '.join(f'"{term}"*' for term in terms)]
+    return [SEARCH_CONFIG, ' '.join(terms)]
+
+
+def index_post(post):
+    """Обновляет запись поста в полнотекстовом индексе."""
+    vendor = connection.vendor
+    if vendor not in UPSERT:
+        return
+    params = {
+        'sqlite': [[post.pk], [post.pk, post.text]],
+        'postgresql': [[post.pk, SEARCH_CONFIG, post.text]],
+    }[vendor]
+    with connection.cursor() as cursor:
+        for sql, sql_params in zip(UPSERT[vendor], params):
+            cursor.execute(sql, sql_params)
+
+
+def unindex_post(post_id):
+    if connection.vendor in DELETE:
+        with connection.cursor() as cursor:
+            cursor.execute(DELETE[connection.vendor], [post_id])
+
+
+def match_sql(query):
+    """(sql, params) подзапроса с id подходящих постов или None, если
+    у СУБД нет полнотекстового индекса."""
+    terms = search_terms(query)
+    if not terms or connection.vendor not in MATCH:
+        return None
+    return MATCH[connection.vendor], match_params(connection.vendor, terms)
+
+
+class SearchResults:
+    """Посты по запросу в порядке релевантности.
+
+    Поддерживает count() и срезы — этого достаточно Paginator; каждая
+    страница — один запрос к индексу и один in_bulk по id.
+    """
+
+    def __init__(self, query):
+        self.terms = search_terms(query)
+        # Поиск только читает: индекс берётся из базы для чтения постов.
+        self.connection = connections[router.db_for_read(Post)]
+        self.vendor = self.connection.vendor
+
+    def fallback(self):
+        posts = Post.objects.all()
+        for term in self.terms:
+            posts = posts.filter(text__icontains=term)
+        return posts
+
+    def count(self):
+        if not self.terms:
+            return 0
+        if self.vendor not in MATCH:
+            return self.fallback().count()
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM ({MATCH[self.vendor]}) AS found',
+                match_params(self.vendor, self.terms)
+            )
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, item):
+        if not self.terms:
+            return []
+        if self.vendor not in MATCH:
+            return list(self.fallback().cards()[item])
+        params = match_params(self.vendor, self.terms)
+        if self.vendor == 'postgresql':
+            params *= 2
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                RANKED[self.vendor],
+                params + [item.stop - item.start, item.start]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.cards().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,250 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import invalidate
+from .counters import bump
+from .feeds import (feeds_of_post, feeds_of_posts, follow_feed, group_feed,
+                    profile_feed, tag_feed)
+from .models import (Comment, Follow, Group, ImageVariant, MediaBlob, Post,
+                     PostTag, UserCounters)
+from .objects import forget, forget_posts
+from .search import index_post, unindex_post
+from .tags import count_tags, sync_mentions, sync_tags
+from .timelines import (backfill_timeline, post_readers, push_post,
+                        remove_author)
+
+User = get_user_model()
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        bump(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def bump_blob(name, delta):
+    """Сдвигает число постов, ссылающихся на файл картинки."""
+    if not name:
+        return
+    if delta > 0:
+        MediaBlob.objects.get_or_create(name=name)
+    MediaBlob.objects.filter(name=name).update(
+        refs=F('refs') + delta, updated=timezone.now()
+    )
+
+
+def previous_value(instance, field):
+    if instance.pk is None:
+        return None
+    return type(instance).objects.filter(
+        pk=instance.pk
+    ).values_list(field, flat=True).first()
+
+
+def previous_values(instance, *fields):
+    if instance.pk is None:
+        return None
+    return type(instance).objects.filter(
+        pk=instance.pk
+    ).values_list(*fields).first()
+
+
+def user_changed(update_fields):
+    # Вход обновляет только last_login: кешированный профиль не меняется.
+    return update_fields is None or set(update_fields) != {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields, **kwargs):
+    # Имя может смениться, только если оно среди сохраняемых полей.
+    instance._previous_username = None
+    if update_fields is None or 'username' in update_fields:
+        instance._previous_username = previous_value(instance, 'username')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+    if not user_changed(update_fields):
+        return
+    previous = getattr(instance, '_previous_username', None)
+    forget(User, instance.username, previous)
+    if created:
+        return
+    feeds = {profile_feed(instance.username)}
+    if previous is not None and previous != instance.username:
+        # Имя автора — в каждой карточке и ссылке на его профиль.
+        posts = Post.objects.filter(author=instance)
+        forget_posts(posts)
+        feeds |= feeds_of_posts(posts) | {profile_feed(previous)}
+    invalidate(feeds)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget(User, instance.username)
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    instance._previous_card = previous_values(instance, 'slug', 'title')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_card', None)
+    previous_slug = previous[0] if previous else None
+    forget(Group, instance.slug, previous_slug)
+    if created:
+        return
+    feeds = {group_feed(instance.slug)}
+    if previous is not None and previous != (instance.slug, instance.title):
+        # Адрес и название группы — в каждой карточке её постов.
+        posts = Post.objects.filter(group=instance)
+        forget_posts(posts)
+        feeds |= feeds_of_posts(posts) | {group_feed(previous_slug)}
+    invalidate(feeds)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты останутся без группы через UPDATE, без сигналов.
+    posts = Post.objects.filter(group=instance)
+    forget_posts(posts)
+    invalidate(feeds_of_posts(posts) | {group_feed(instance.slug)})
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    forget(Group, instance.slug)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    instance.preview = Post.make_preview(instance.text)
+    instance._previous_group = (None, None)
+    previous_image = None
+    if instance.pk is not None:
+        group_id, slug, previous_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list(
+            'group_id', 'group__slug', 'image'
+        ).first() or (None, None, None)
+        instance._previous_group = (group_id, slug)
+    instance._previous_image = previous_image
+    if instance.image.name != previous_image:
+        # Новая картинка снова попадает в очередь process_thumbnails.
+        instance.thumbnail = ''
+        instance.thumbnail_failed = False
+        if instance.pk is not None:
+            ImageVariant.objects.filter(post_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    previous_image = getattr(instance, '_previous_image', None)
+    if instance.image.name != previous_image:
+        bump_blob(instance.image.name, 1)
+        bump_blob(previous_image, -1)
+    forget(Post, instance.pk)
+    index_post(instance)
+    removed_tags = sync_tags(instance)
+    sync_mentions(instance)
+    if created:
+        readers = post_readers(instance.author_id)
+        push_post(instance, readers)
+        bump(UserCounters.objects.filter(user_id=instance.author_id),
+             posts_count=1)
+        bump_group(instance.group_id, 1)
+        invalidate(feeds_of_post(instance, readers))
+        return
+    previous_group_id, previous_slug = getattr(
+        instance, '_previous_group', (None, None)
+    )
+    feeds = feeds_of_post(instance)
+    feeds.extend(map(tag_feed, removed_tags))
+    if previous_group_id != instance.group_id:
+        bump_group(previous_group_id, -1)
+        bump_group(instance.group_id, 1)
+        if previous_slug is not None:
+            feeds.append(group_feed(previous_slug))
+    invalidate(feeds)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Строки PostTag удалит каскад без сигналов: счётчики тегов
+    # сдвигаются здесь, а их имена нужны post_deleted для лент.
+    tags = dict(PostTag.objects.filter(post=instance).values_list(
+        'tag_id', 'tag__name'
+    ))
+    if tags:
+        count_tags(list(tags), instance.pub_date.date(), -1)
+    instance._tag_names = list(tags.values())
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_blob(instance.image.name, -1)
+    forget(Post, instance.pk)
+    unindex_post(instance.pk)
+    bump(UserCounters.objects.filter(user_id=instance.author_id),
+         posts_count=-1)
+    bump_group(instance.group_id, -1)
+    feeds = feeds_of_post(instance)
+    feeds.extend(map(tag_feed, getattr(instance, '_tag_names', ())))
+    invalidate(feeds)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        bump(Post.objects.filter(pk=instance.post_id), comments_count=1)
+        bump(UserCounters.objects.filter(user_id=instance.author_id),
+             comments_count=1)
+    forget(Post, instance.post_id)
+    # Профиль автора комментария показывает число его комментариев.
+    invalidate([profile_feed(instance.author.username)])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump(Post.objects.filter(pk=instance.post_id), comments_count=-1)
+    bump(UserCounters.objects.filter(user_id=instance.author_id),
+         comments_count=-1)
+    forget(Post, instance.post_id)
+    invalidate([profile_feed(instance.author.username)])
+
+
+def follow_changes(follow):
+    """Подписка меняет ленту подписчика и обе страницы профиля."""
+    return [
+        follow_feed(follow.user_id),
+        profile_feed(follow.user.username),
+        profile_feed(follow.author.username),
+    ]
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance.user_id, instance.author_id)
+        bump(UserCounters.objects.filter(user_id=instance.author_id),
+             followers_count=1)
+        bump(UserCounters.objects.filter(user_id=instance.user_id),
+             following_count=1)
+    invalidate(follow_changes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    remove_author(instance.user_id, instance.author_id)
+    bump(UserCounters.objects.filter(user_id=instance.author_id),
+         followers_count=-1)
+    bump(UserCounters.objects.filter(user_id=instance.user_id),
+         following_count=-1)
+    invalidate(follow_changes(instance))
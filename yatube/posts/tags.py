@@ -0,0 +1,136 @@
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from .constants import (TAG_MAX_LENGTH, TRENDING_CACHE_TIMEOUT,
+                        TRENDING_DAYS, TRENDING_TAGS_LIMIT)
+from .caching import invalidate
+from .counters import bump
+from .feeds import TRENDING_FEED
+from .models import Mention, PostTag, Tag, TagTrend
+
+User = get_user_model()
+
+TAG_PATTERN = re.compile(r'(?<![\w#])#(\w+)')
+MENTION_PATTERN = re.compile(r'(?<![\w@])@([\w.@+-]+)')
+TRENDING_KEY = 'trending-tags'
+TRENDING_SHOWN_KEY = 'trending-tags:shown'
+
+
+def extract_tags(text):
+    """Имена хештегов поста в нижнем регистре, без слишком длинных."""
+    return {
+        name.lower() for name in TAG_PATTERN.findall(text)
+        if len(name) <= TAG_MAX_LENGTH
+    }
+
+
+def extract_mentions(text):
+    """Имена упомянутых пользователей; точка в конце — знак препинания."""
+    return {name.rstrip('.') for name in MENTION_PATTERN.findall(text)}
+
+
+def sync_tags(post):
+    """Приводит теги поста к хештегам в его тексте.
+
+    Строки PostTag пишутся и удаляются пачкой, без сигналов: счётчики
+    тегов сдвигаются здесь же, запросом на все теги сразу, а не на
+    каждый. Возвращает имена убранных тегов — их лент feeds_of_post
+    уже не найдёт.
+    """
+    names = extract_tags(post.text)
+    current = dict(
+        PostTag.objects.filter(post=post).values_list('tag__name', 'tag_id')
+    )
+    day = post.pub_date.date()
+    removed = {
+        name: tag_id for name, tag_id in current.items() if name not in names
+    }
+    if removed:
+        PostTag.objects.filter(
+            post=post, tag_id__in=removed.values()
+        ).delete()
+        count_tags(list(removed.values()), day, -1)
+    added = names - current.keys()
+    if added:
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in added], ignore_conflicts=True
+        )
+        tag_ids = list(
+            Tag.objects.filter(name__in=added).values_list('pk', flat=True)
+        )
+        PostTag.objects.bulk_create(
+            PostTag(post=post, tag_id=tag_id, pub_date=post.pub_date)
+            for tag_id in tag_ids
+        )
+        count_tags(tag_ids, day, 1)
+    return list(removed)
+
+
+def sync_mentions(post):
+    """Приводит упоминания поста к существующим пользователям из текста."""
+    user_ids = set(User.objects.filter(
+        username__in=extract_mentions(post.text)
+    ).values_list('pk', flat=True))
+    current = set(
+        Mention.objects.filter(post=post).values_list('user_id', flat=True)
+    )
+    if current - user_ids:
+        Mention.objects.filter(
+            post=post, user_id__in=current - user_ids
+        ).delete()
+    Mention.objects.bulk_create(
+        [Mention(post=post, user_id=user_id, pub_date=post.pub_date)
+         for user_id in user_ids - current],
+        ignore_conflicts=True
+    )
+
+
+def count_tags(tag_ids, day, delta):
+    """Сдвигает счётчики тегов и их числа постов за день публикации."""
+    bump(Tag.objects.filter(pk__in=tag_ids), posts_count=delta)
+    if delta > 0:
+        TagTrend.objects.bulk_create(
+            [TagTrend(tag_id=tag_id, day=day) for tag_id in tag_ids],
+            ignore_conflicts=True
+        )
+    bump(
+        TagTrend.objects.filter(tag_id__in=tag_ids, day=day),
+        posts_count=delta
+    )
+
+
+def trending_tags():
+    """Самые частые теги за последние TRENDING_DAYS дней.
+
+    Складываются уже посчитанные дневные счётчики, а не строки PostTag;
+    результат живёт в кеше TRENDING_CACHE_TIMEOUT секунд.
+    """
+    tags = cache.get(TRENDING_KEY)
+    if tags is None:
+        since = timezone.now().date() - timedelta(days=TRENDING_DAYS - 1)
+        tags = list(TagTrend.objects.filter(day__gte=since).values(
+            'tag__name'
+        ).annotate(total=Sum('posts_count')).filter(total__gt=0).order_by(
+            '-total', 'tag__name'
+        ).values_list('tag__name', 'total')[:TRENDING_TAGS_LIMIT])
+        cache.set(TRENDING_KEY, tags, TRENDING_CACHE_TIMEOUT)
+        # Поколение блока сдвигается, только если его состав изменился.
+        if tags != cache.get(TRENDING_SHOWN_KEY):
+            cache.set(TRENDING_SHOWN_KEY, tags, None)
+            invalidate([TRENDING_FEED])
+    return tags
+
+
+def trending_feeds(request, *args, **kwargs):
+    """Лента блока популярных тегов — для валидаторов страниц с ним.
+
+    Истёкший список пересчитывается здесь же: иначе ответ 304 опирался бы
+    на поколение, ещё не знающее о новом составе блока.
+    """
+    trending_tags()
+    return (TRENDING_FEED,)
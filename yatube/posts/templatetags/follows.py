@@ -0,0 +1,15 @@
+from django import template
+
+from ..models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag
+def is_following(user, username):
+    """Подписан ли пользователь на автора с именем username."""
+    if not user.is_authenticated:
+        return False
+    return Follow.objects.filter(
+        user=user, author__username=username
+    ).exists()
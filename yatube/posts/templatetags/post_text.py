@@ -0,0 +1,28 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from ..constants import TAG_MAX_LENGTH
+from ..tags import TAG_PATTERN
+
+register = template.Library()
+
+
+@register.filter
+def link_tags(text):
+    """Текст поста, где хештеги ведут на ленты тегов."""
+    parts, last = [], 0
+    for match in TAG_PATTERN.finditer(text):
+        name = match.group(1)
+        if len(name) > TAG_MAX_LENGTH:
+            continue
+        parts.append(conditional_escape(text[last:match.start()]))
+        parts.append(format_html(
+            '<a href="{}">{}</a>',
+            reverse('posts:tag_posts', args=[name.lower()]),
+            match.group()
+        ))
+        last = match.end()
+    parts.append(conditional_escape(text[last:]))
+    return mark_safe(''.join(parts))
@@ -0,0 +1,10 @@
+from django import template
+
+from .. import tags
+
+register = template.Library()
+
+
+@register.simple_tag
+def trending_tags():
+    return tags.trending_tags()
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..forms import PostForm
+from ..models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_counters_follow_writes_and_cascades(self):
+        """Счётчики меняются при создании и каскадном удалении"""
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Ура')
+        Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).comments_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.counters(self.reader).comments_count, 0)
+
+        another_author = User.objects.create_user(username='another')
+        Follow.objects.create(user=self.reader, author=another_author)
+        another_author.delete()
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+
+    def test_post_edit_keeps_concurrent_counters(self):
+        """Правка поста не затирает счётчик, сдвинутый после загрузки"""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        loaded = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.reader, text='Ура')
+        form = PostForm({'text': 'Новый текст'}, instance=loaded)
+        self.assertTrue(form.is_valid())
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount восстанавливает счётчики по данным"""
+        Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group
+        )
+        UserCounters.objects.update(posts_count=42)
+        Group.objects.update(posts_count=42)
+        call_command('recount', chunk_size=1, stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
@@ -1,6 +1,9 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -8,8 +11,12 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
-from posts.models import Group, Post
+from core.storages import content_name
+from posts.constants import POST_IMAGE_MAX_SIDE
+from posts.models import Group, MediaBlob, Post
+from posts.objects import get_cached_or_404
 
 User = get_user_model()
 login_url = reverse('users:login')
@@ -67,6 +74,9 @@ class PostCreateFormTests(TestCase):
             content_type='image/gif'
 
         )
+        self.image_name = content_name(
+            'posts/small.gif', hashlib.sha256(self.small_gif).hexdigest()
+        )
         cache.clear()
 
     def tearDown(self):
@@ -94,7 +104,7 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(
             Post.objects.filter(text='Тестовый текст',
                                 group=group_id,
-                                image='posts/small.gif').exists()
+                                image=self.image_name).exists()
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
@@ -117,6 +127,71 @@ class PostCreateFormTests(TestCase):
         )
         self.assertEqual(invalid_response.status_code, HTTPStatus.OK)
 
+    def test_image_upload_limits(self):
+        """Слишком тяжёлые и слишком большие в пикселях картинки
+        отклоняются, пост не создаётся"""
+        posts_count = Post.objects.count()
+        for setting, code in (
+            ('POST_IMAGE_MAX_BYTES', 'file_too_large'),
+            ('POST_IMAGE_MAX_PIXELS', 'too_many_pixels'),
+        ):
+            with self.subTest(setting=setting):
+                self.uploaded.seek(0)
+                with mock.patch(f'posts.uploads.{setting}', 1):
+                    response = self.author_client.post(
+                        reverse('posts:post_create'),
+                        data={'text': 'Текст', 'image': self.uploaded}
+                    )
+                self.assertTrue(
+                    response.context['form'].has_error('image', code)
+                )
+                self.assertEqual(Post.objects.count(), posts_count)
+
+    def test_oversized_image_is_downsized(self):
+        """Картинка больше допустимой стороны уменьшается
+        и пересохраняется в JPEG"""
+        buffer = BytesIO()
+        Image.new('RGB', (POST_IMAGE_MAX_SIDE * 2, 10)).save(buffer, 'PNG')
+        upload = SimpleUploadedFile(
+            'wide.png', buffer.getvalue(), content_type='image/png'
+        )
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Широкая картинка', 'image': upload}
+        )
+        post = Post.objects.get(text='Широкая картинка')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual(post.image.width, POST_IMAGE_MAX_SIDE)
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковые картинки разных постов — один файл со счётчиком
+        ссылок"""
+        posts = []
+        for text in ('Первый', 'Второй'):
+            upload = SimpleUploadedFile(
+                f'{text}.gif', self.small_gif, content_type='image/gif'
+            )
+            posts.append(Post.objects.create(
+                text=text, author=self.author, image=upload
+            ))
+        self.assertEqual(
+            {post.image.name for post in posts}, {self.image_name}
+        )
+        self.assertEqual(MediaBlob.objects.get(name=self.image_name).refs, 2)
+        posts[0].delete()
+        self.assertEqual(MediaBlob.objects.get(name=self.image_name).refs, 1)
+
+    def test_concurrent_upload_of_same_image(self):
+        """Файл, записанный параллельной загрузкой между проверкой и
+        записью, — то же содержимое, а не повод искать новое имя"""
+        storage = Post._meta.get_field('image').storage
+        storage.save('posts/small.gif', self.uploaded)
+        with mock.patch.object(type(storage), 'exists', return_value=False):
+            name = storage.save('posts/copy.gif', SimpleUploadedFile(
+                'copy.gif', self.small_gif, content_type='image/gif'
+            ))
+        self.assertEqual(name, self.image_name)
+
     def test_post_edit(self):
         """При отправке валидной формы со страницы редактирования поста
         происходит изменение поста в базе данных."""
@@ -141,7 +216,19 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(
             Post.objects.filter(text='Измененный тестовый текст',
                                 group=group_id,
-                                image='posts/small.gif').exists()
+                                image=self.image_name).exists()
+        )
+
+    def test_post_edit_ignores_object_cache(self):
+        """Форма правки заполняется из базы, а не из кеша объектов,
+        который мог устареть"""
+        get_cached_or_404(Post, self.post.pk)
+        Post.objects.filter(pk=self.post.pk).update(text='Свежий текст')
+        response = self.author_client.get(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(
+            response.context['form'].initial['text'], 'Свежий текст'
         )
 
     def test_another_author_abilities(self):
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from sorl.thumbnail import default as thumbnail_default
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from ..constants import THUMBNAIL_BATCH_SIZE
+from ..models import MediaBlob, Post
+from ..thumbnails import generate_thumbnails
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def age(self, name):
+        """Делает файл старше срока, который сборщик не трогает."""
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        old = time.time() - 2 * 60 * 60 * 24
+        os.utime(path, (old, old))
+        MediaBlob.objects.filter(name=name).update(
+            updated=timezone.now() - timedelta(days=2)
+        )
+        return path
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_media', '--pause=0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_unreferenced_files_are_collected(self):
+        """Сборщик удаляет только файлы удалённых постов"""
+        author = User.objects.create_user(username='author')
+        kept, removed = (
+            Post.objects.create(
+                text=text, author=author,
+                image=SimpleUploadedFile(
+                    f'{text}.gif', SMALL_GIF + text.encode(),
+                    content_type='image/gif'
+                )
+            )
+            for text in ('kept', 'removed')
+        )
+        generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        kept.refresh_from_db()
+        removed.refresh_from_db()
+        paths = {
+            name: self.age(name)
+            for post in (kept, removed)
+            for name in [post.image.name, post.thumbnail.name] + [
+                variant.file.name for variant in post.image_variants.all()
+            ]
+        }
+        removed_names = {
+            name for name in paths
+            if name not in {kept.image.name, kept.thumbnail.name}
+            and not kept.image_variants.filter(file=name).exists()
+        }
+        removed.delete()
+        self.age(removed.image.name)
+        self.assertIn('можно удалить', self.collect('--dry-run'))
+        self.assertTrue(all(os.path.exists(path) for path in paths.values()))
+        self.collect()
+        for name, path in paths.items():
+            with self.subTest(name=name):
+                self.assertEqual(
+                    os.path.exists(path), name not in removed_names
+                )
+        self.assertFalse(
+            MediaBlob.objects.filter(name=removed.image.name).exists()
+        )
+
+    def test_fresh_files_are_kept(self):
+        """Недавно записанные файлы не удаляются: ссылка на них
+        может ещё не быть сохранена"""
+        path = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'upload.gif')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        self.collect()
+        self.assertTrue(os.path.exists(path))
+        self.age('posts/upload.gif')
+        self.collect()
+        self.assertFalse(os.path.exists(path))
+
+    def test_released_blob_waits_for_grace(self):
+        """Оригинал, последняя ссылка на который удалена только что,
+        остаётся до конца срока"""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            text='Пост', author=author,
+            image=SimpleUploadedFile(
+                'post.gif', SMALL_GIF, content_type='image/gif'
+            )
+        )
+        path = os.path.join(TEMP_MEDIA_ROOT, post.image.name)
+        old = time.time() - 2 * 60 * 60 * 24
+        os.utime(path, (old, old))
+        post.delete()
+        self.collect()
+        self.assertTrue(os.path.exists(path))
+        self.age(post.image.name)
+        self.collect()
+        self.assertFalse(os.path.exists(path))
+
+    def test_keys_of_missing_files_are_swept(self):
+        """Записи sorl о файлах, которых больше нет, удаляются"""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            text='Пост', author=author,
+            image=SimpleUploadedFile(
+                'post.gif', SMALL_GIF, content_type='image/gif'
+            )
+        )
+        generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        post.refresh_from_db()
+        image = ImageFile(post.image.name, post.image.storage)
+        self.assertIsNotNone(thumbnail_default.kvstore.get(image))
+        os.remove(os.path.join(TEMP_MEDIA_ROOT, post.image.name))
+        self.assertIn('можно удалить 1 устаревших', self.collect('--dry-run'))
+        self.assertIsNotNone(thumbnail_default.kvstore.get(image))
+        self.collect('--batch-size=1')
+        self.assertIsNone(thumbnail_default.kvstore.get(image))
+        self.assertFalse(KVStore.objects.filter(
+            key__startswith=add_prefix('', 'thumbnails')
+        ).exists())
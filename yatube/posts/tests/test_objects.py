@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+from ..objects import get_cached_or_404
+
+User = get_user_model()
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+
+    def test_missing_objects_do_not_reach_database(self):
+        """Повторный запрос несуществующих поста, группы и профиля
+        обходится без базы, а созданный объект сразу виден"""
+        urls = [
+            reverse('posts:post_detail', args=[404]),
+            reverse('posts:group_list', args=['nope']),
+            reverse('posts:profile', args=['nobody']),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url).status_code, 404)
+        Group.objects.create(title='Группа', slug='nope', description='')
+        User.objects.create_user(username='nobody')
+        for url in urls[1:]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_cached_objects_follow_changes(self):
+        """Записи кеша сбрасываются при правке объекта, комментариях
+        и переименовании автора"""
+        post = Post.objects.create(text='Текст', author=self.author)
+        get_cached_or_404(Post, post.pk)
+        with self.assertNumQueries(0):
+            cached = get_cached_or_404(Post, post.pk)
+        self.assertEqual(cached.author.username, 'author')
+        Comment.objects.create(post=post, author=self.author, text='Ответ')
+        self.assertEqual(get_cached_or_404(Post, post.pk).comments_count, 1)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(get_cached_or_404(Post, post.pk).text, 'Новый текст')
+        get_cached_or_404(User, 'author')
+        self.author.username = 'writer'
+        self.author.save()
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:profile', args=['author'])
+            ).status_code,
+            404
+        )
+        self.assertEqual(
+            get_cached_or_404(Post, post.pk).author.username, 'writer'
+        )
+
+    def test_posts_survive_unrelated_profile_and_group_edits(self):
+        """Правка, не задевающая имя автора или адрес и название группы,
+        не сбрасывает записи кеша их постов"""
+        group = Group.objects.create(title='Группа', slug='group')
+        post = Post.objects.create(
+            text='Текст', author=self.author, group=group
+        )
+        get_cached_or_404(Post, post.pk)
+        self.author.first_name = 'Имя'
+        self.author.save()
+        group.description = 'Новое описание'
+        group.save()
+        with self.assertNumQueries(0):
+            get_cached_or_404(Post, post.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertEqual(
+            get_cached_or_404(Post, post.pk).group.title, 'Новое название'
+        )
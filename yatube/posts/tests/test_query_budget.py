@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetTestMixin
+
+from ..constants import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+from ..models import Comment, Follow, Group, Post, User
+from ..urls import urlpatterns
+
+
+@override_settings(QUERY_BUDGET_SAMPLE=1)
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for i in range(POSTS_PER_PAGE + 2):
+            cls.post = Post.objects.create(
+                text=f'Пост {i} #тег для @reader',
+                author=cls.author,
+                group=cls.group
+            )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE * 2)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def requests(self):
+        post_id = self.post.pk
+        username = self.author.username
+        return {
+            'index': (self.reader_client.get, reverse('posts:index'), None),
+            'group_list': (
+                self.reader_client.get,
+                reverse('posts:group_list', args=[self.group.slug]),
+                None
+            ),
+            'tag_posts': (
+                self.reader_client.get,
+                reverse('posts:tag_posts', args=['тег']),
+                None
+            ),
+            'profile': (
+                self.reader_client.get,
+                reverse('posts:profile', args=[username]),
+                None
+            ),
+            'search': (
+                self.reader_client.get,
+                reverse('posts:search'),
+                {'q': 'пост'}
+            ),
+            'post_detail': (
+                self.reader_client.get,
+                reverse('posts:post_detail', args=[post_id]),
+                None
+            ),
+            'post_comments': (
+                self.reader_client.get,
+                reverse('posts:post_comments', args=[post_id]),
+                None
+            ),
+            'post_create': (
+                self.author_client.post,
+                reverse('posts:post_create'),
+                {'text': 'Новый пост #тег #ещё @reader',
+                 'group': self.group.pk}
+            ),
+            'post_edit': (
+                self.author_client.post,
+                reverse('posts:post_edit', args=[post_id]),
+                {'text': 'Правка #другой', 'group': self.group.pk}
+            ),
+            'add_comment': (
+                self.reader_client.post,
+                reverse('posts:add_comment', args=[post_id]),
+                {'text': 'Комментарий'}
+            ),
+            'follow_index': (
+                self.reader_client.get, reverse('posts:follow_index'), None
+            ),
+            'profile_unfollow': (
+                self.reader_client.get,
+                reverse('posts:profile_unfollow', args=[username]),
+                None
+            ),
+            'profile_follow': (
+                self.reader_client.get,
+                reverse('posts:profile_follow', args=[username]),
+                None
+            ),
+        }
+
+    def test_every_view_stays_within_query_budget(self):
+        """Каждое представление posts укладывается в объявленный
+        бюджет запросов и не повторяет запросы на каждый пост"""
+        requests = self.requests()
+        self.assertEqual(
+            set(requests), {pattern.name for pattern in urlpatterns}
+        )
+        for name, (method, url, data) in requests.items():
+            with self.subTest(view=name):
+                response = method(url, data)
+                self.assertLess(response.status_code, 400)
+                self.assertWithinQueryBudget(response)
@@ -0,0 +1,63 @@
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ..constants import POSTS_PER_PAGE
+from ..models import Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.url = reverse('posts:search')
+
+    def found(self, query, page=1):
+        response = self.client.get(self.url, {'q': query, 'page': page})
+        return [post.text for post in response.context['page_obj']]
+
+    def test_search_is_ranked_and_follows_edits(self):
+        """Поиск находит посты по словам, выше — более релевантные;
+        правка и удаление поста сразу видны в поиске"""
+        Post.objects.create(text='Кошки и собаки', author=self.author)
+        dogs = Post.objects.create(
+            text='Собаки, собаки, собаки', author=self.author
+        )
+        Post.objects.create(text='Про птиц', author=self.author)
+        self.assertEqual(
+            self.found('собаки'),
+            ['Собаки, собаки, собаки', 'Кошки и собаки']
+        )
+        self.assertEqual(self.found('кош'), ['Кошки и собаки'])
+        self.assertEqual(self.found('кошки" ('), ['Кошки и собаки'])
+        dogs.text = 'Теперь про рыб'
+        dogs.save()
+        self.assertEqual(self.found('рыб'), ['Теперь про рыб'])
+        dogs.delete()
+        self.assertEqual(self.found('рыб'), [])
+
+    def test_search_pages_keep_query(self):
+        """Ссылки пагинатора сохраняют поисковый запрос"""
+        Post.objects.bulk_create(
+            Post(text=f'Пост номер {i}', author=self.author)
+            for i in range(POSTS_PER_PAGE + 1)
+        )
+        for post in Post.objects.all():
+            post.save()
+        response = self.client.get(self.url, {'q': 'пост'})
+        self.assertContains(response, '?q=%D0%BF%D0%BE%D1%81%D1%82&amp;page=2')
+        self.assertEqual(len(self.found('пост', page=2)), 1)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по тому же индексу"""
+        post = Post.objects.create(text='Кошки и собаки', author=self.author)
+        Post.objects.create(text='Про птиц', author=self.author)
+        queryset, use_distinct = site._registry[Post].get_search_results(
+            None, Post.objects.all(), 'собак'
+        )
+        self.assertEqual(list(queryset), [post])
+        self.assertFalse(use_distinct)
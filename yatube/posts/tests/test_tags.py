@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..constants import POST_PREVIEW_LENGTH, POSTS_PER_PAGE
+from ..models import Mention, Post, Tag
+from ..tags import trending_tags
+
+User = get_user_model()
+
+
+class TagTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def tag_page(self, name):
+        response = self.client.get(reverse('posts:tag_posts', args=[name]))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_tags_and_mentions_follow_post_text(self):
+        """Хештеги и упоминания разбираются при записи поста,
+        счётчики тегов и ленты тегов следуют за правками и удалением"""
+        post = Post.objects.create(
+            text='#Кошки и #dogs, спасибо @reader.', author=self.author
+        )
+        counts = dict(Tag.objects.values_list('name', 'posts_count'))
+        self.assertEqual(counts, {'кошки': 1, 'dogs': 1})
+        self.assertEqual(
+            list(Mention.objects.values_list('post', 'user')),
+            [(post.pk, self.reader.pk)]
+        )
+        self.assertEqual(self.tag_page('Кошки'), [post.text])
+        self.assertEqual(trending_tags(), [('dogs', 1), ('кошки', 1)])
+
+        post.text = 'Только #кошки'
+        post.save()
+        counts = dict(Tag.objects.values_list('name', 'posts_count'))
+        self.assertEqual(counts, {'кошки': 1, 'dogs': 0})
+        self.assertFalse(Mention.objects.exists())
+        self.assertEqual(self.tag_page('dogs'), [])
+        self.assertEqual(self.tag_page('кошки'), ['Только #кошки'])
+
+        post.delete()
+        self.assertEqual(Tag.objects.get(name='кошки').posts_count, 0)
+        self.assertEqual(self.tag_page('кошки'), [])
+        cache.clear()
+        self.assertEqual(trending_tags(), [])
+
+    def test_hashtags_link_to_tag_feeds(self):
+        """Хештеги в тексте поста — ссылки на ленты тегов"""
+        post = Post.objects.create(
+            text='<b>#Кошки</b>', author=self.author
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertContains(
+            response,
+            '&lt;b&gt;<a href="'
+            + reverse('posts:tag_posts', args=['кошки'])
+            + '">#Кошки</a>&lt;/b&gt;'
+        )
+        self.assertEqual(Tag.objects.get().name, 'кошки')
+
+    def test_preview_does_not_cut_hashtags(self):
+        """Хештег на границе превью не превращается в ссылку на обрубок"""
+        post = Post.objects.create(
+            text='слово ' * (POST_PREVIEW_LENGTH // 6 - 1) + 'с #кошки',
+            author=self.author
+        )
+        self.assertNotIn('#', post.preview)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.preview)
+        self.assertNotContains(response, '/tag/')
+
+    def test_tag_feed_pages_by_cursor(self):
+        """Лента тега листается по курсору в порядке публикации и не
+        включает посты без тега"""
+        texts = [f'#кошки {i}' for i in range(POSTS_PER_PAGE + 1)]
+        for text in texts:
+            Post.objects.create(text=text, author=self.author)
+        Post.objects.create(text='Без тега', author=self.author)
+        url = reverse('posts:tag_posts', args=['кошки'])
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url + '?cursor=' + first_page.next_cursor
+        ).context['page_obj']
+        self.assertEqual(
+            [post.text for post in first_page]
+            + [post.text for post in second_page],
+            texts[::-1]
+        )
@@ -0,0 +1,98 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Follow, Post, PulledAuthor, TimelineEntry
+from ..timelines import follow_posts, set_pulled
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author
+        )
+
+    def timeline_posts(self):
+        return list(Post.objects.filter(timeline_entries__user=self.reader))
+
+    def test_follow_backfills_and_unfollow_trims_timeline(self):
+        """Подписка заполняет ленту старыми постами автора,
+        новые посты добавляются, отписка их убирает"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+        new_post = Post.objects.create(
+            text='Пост после подписки',
+            author=self.author
+        )
+        self.assertEqual(self.timeline_posts(), [new_post, self.old_post])
+        follow.delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    @mock.patch('posts.timelines.TIMELINE_LENGTH', 2)
+    def test_timeline_length_is_capped(self):
+        """Команда trim_timelines обрезает ленты подписок до
+        TIMELINE_LENGTH записей, оставляя самые новые"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        out = StringIO()
+        call_command('trim_timelines', stdout=out)
+        self.assertIn('Обрезано лент: 1, удалено записей: 2.', out.getvalue())
+        self.assertEqual(self.timeline_posts(), posts[:0:-1])
+        feed = follow_posts(self.reader).order_by('-pub_date', '-pk')
+        self.assertEqual(list(feed), posts[:0:-1])
+
+
+class HybridFanoutTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.other_reader, author=cls.star)
+
+    def test_heavy_author_posts_are_pulled_and_merged(self):
+        """Посты автора с большим числом подписчиков не раскладываются
+        по лентам, но попадают в ленту подписок по дате"""
+        call_command('classify_authors', threshold=2, stdout=StringIO())
+        self.assertTrue(PulledAuthor.objects.filter(author=self.star).exists())
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=author)
+            for i, author in enumerate(
+                (self.author, self.star, self.author, self.star)
+            )
+        ]
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists()
+        )
+        feed = follow_posts(self.reader).order_by('-pub_date', '-pk')
+        self.assertEqual(feed.count(), 4)
+        self.assertEqual(feed[:3], posts[:0:-1])
+        self.assertEqual(list(feed), posts[::-1])
+
+    def test_author_below_threshold_returns_to_push(self):
+        """Автор, потерявший подписчиков, снова раскладывается по лентам"""
+        set_pulled(self.star.pk, True)
+        post = Post.objects.create(text='Пост', author=self.star)
+        call_command('classify_authors', threshold=3, stdout=StringIO())
+        self.assertFalse(PulledAuthor.objects.exists())
+        self.assertEqual(
+            list(follow_posts(self.reader).order_by('-pub_date', '-pk')),
+            [post]
+        )
@@ -1,15 +1,34 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post
+from core.storages import content_name
+from posts.caching import (cache_stats, lock_key, page_cache_key,
+                           render_cards, versioned_feed)
+from posts.constants import (COMMENTS_PER_PAGE, PAGINATOR_WINDOW,
+                             POST_IMAGE_WIDTHS, POST_PREVIEW_LENGTH,
+                             THUMBNAIL_BATCH_SIZE)
+from posts.feeds import INDEX_FEED, group_feed
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import FeedPaginator
+from posts.tags import TRENDING_KEY
+from posts.thumbnails import (generate_thumbnails, pending_posts,
+                              variant_savings)
 
 User = get_user_model()
 
@@ -41,6 +60,9 @@ class PostPagesTests(TestCase):
             content=cls.small_gif,
             content_type='image/gif'
         )
+        cls.image_name = content_name(
+            'posts/small.gif', hashlib.sha256(cls.small_gif).hexdigest()
+        )
 
         cls.group_with_post = Group.objects.create(
             title='Тестовое название',
@@ -131,7 +153,7 @@ class PostPagesTests(TestCase):
             post_image_0 = first_object.image
             self.assertEqual(post_text_0, 'Тестовый текст')
             self.assertEqual(post_author_0, 'author')
-            self.assertEqual(post_image_0, 'posts/small.gif')
+            self.assertEqual(post_image_0, self.image_name)
 
     def test_post_detail_pages_show_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
@@ -152,7 +174,7 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(
             response.context.get('post').image,
-            'posts/small.gif'
+            self.image_name
         )
 
     def test_post_edit_and_create_page_show_correct_context(self):
@@ -171,6 +193,120 @@ class PostPagesTests(TestCase):
                 form_field = response.context.get('form').fields.get(value)
                 self.assertIsInstance(form_field, expected)
 
+    def test_thumbnail_is_generated_outside_request(self):
+        """Пока миниатюры нет, вместо неё заглушка; готовая миниатюра
+        появляется на закешированных страницах"""
+        url = self.URLS_DIC['POST_DETAIL']
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            response = self.author_client.get(url)
+            self.author_client.get(self.URLS_DIC['INDEX'])
+        get_thumbnail.assert_not_called()
+        self.assertContains(response, 'Изображение обрабатывается')
+        self.assertEqual(generate_thumbnails(THUMBNAIL_BATCH_SIZE), 1)
+        self.assertFalse(pending_posts().exists())
+        self.post.refresh_from_db()
+        for url in (url, self.URLS_DIC['INDEX']):
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertNotContains(response, 'Изображение обрабатывается')
+                self.assertContains(response, self.post.thumbnail.url)
+                self.assertContains(response, 'type="image/webp"')
+        self.assertEqual(
+            set(self.post.image_variants.filter(
+                format='WEBP'
+            ).values_list('width', flat=True)),
+            set(POST_IMAGE_WIDTHS)
+        )
+        self.assertEqual(
+            len(variant_savings()), self.post.image_variants.count()
+        )
+
+    def test_unreadable_image_is_marked_failed(self):
+        """Нечитаемая картинка помечается и уходит из очереди,
+        а не подменяет миниатюру оригиналом"""
+        generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        post = Post.objects.create(
+            text='Пропавшая картинка',
+            author=self.author,
+            image=SimpleUploadedFile(
+                'lost.gif', self.small_gif + b'lost', content_type='image/gif'
+            )
+        )
+        os.remove(post.image.path)
+        with self.assertLogs('sorl.thumbnail', 'ERROR'), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_failed)
+        self.assertEqual(post.thumbnail, '')
+        self.assertFalse(pending_posts().exists())
+        self.assertContains(
+            self.author_client.get(self.URLS_DIC['INDEX']),
+            'Изображение не удалось обработать'
+        )
+        out = StringIO()
+        with mock.patch(
+            'posts.management.commands.process_thumbnails'
+            '.generate_thumbnails', return_value=0
+        ):
+            call_command('process_thumbnails', '--retry-failed', '--once',
+                         stdout=out)
+        self.assertIn('Возвращено в очередь: 1.', out.getvalue())
+        self.assertEqual(list(pending_posts()), [post])
+
+    def test_failed_variant_keeps_thumbnail_and_other_variants(self):
+        """Ошибка одного варианта не отменяет миниатюру
+        и остальные варианты"""
+        save = default_storage.save
+
+        def failing_save(name, content, *args, **kwargs):
+            if name.endswith('_320.webp'):
+                raise OSError('Диск переполнен')
+            return save(name, content, *args, **kwargs)
+
+        with mock.patch.object(default_storage, 'save', failing_save), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.thumbnail_failed)
+        self.assertNotEqual(self.post.thumbnail, self.post.image)
+        webp_widths = set(self.post.image_variants.filter(
+            format='WEBP'
+        ).values_list('width', flat=True))
+        self.assertEqual(webp_widths, set(POST_IMAGE_WIDTHS) - {320})
+
+    def test_same_image_reuses_thumbnail(self):
+        """Миниатюра одинаковой картинки рисуется один раз"""
+        generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        self.post.refresh_from_db()
+        twin = Post.objects.create(
+            text='Та же картинка',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'copy.gif', self.small_gif, content_type='image/gif'
+            )
+        )
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        get_thumbnail.assert_not_called()
+        twin.refresh_from_db()
+        self.assertEqual(twin.thumbnail, self.post.thumbnail)
+        self.assertEqual(
+            twin.image_variants.count(), self.post.image_variants.count()
+        )
+
+    def test_feed_pages_do_not_look_up_thumbnails(self):
+        """Готовые миниатюры берутся из строк постов страницы,
+        без обращений к хранилищу ключей sorl"""
+        generate_thumbnails(THUMBNAIL_BATCH_SIZE)
+        self.post.refresh_from_db()
+        with mock.patch('sorl.thumbnail.default.kvstore') as kvstore:
+            for name in ('INDEX', 'GROUP_LIST', 'PROFILE', 'POST_DETAIL'):
+                with self.subTest(page=name):
+                    response = self.client.get(self.URLS_DIC[name])
+                    self.assertContains(response, self.post.thumbnail.url)
+        self.assertEqual(kvstore.mock_calls, [])
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -225,6 +361,111 @@ class PaginatorViewsTest(TestCase):
             )
             self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages_match_numbered_pages(self):
+        """Переход по курсору ведёт туда же, куда и номер страницы,
+        а битый курсор открывает первую страницу"""
+        for url in self.URLS_DIC.values():
+            with self.subTest(url=url):
+                first_page = self.client.get(url).context['page_obj']
+                second_page = self.client.get(
+                    url + '?cursor=' + first_page.next_cursor
+                ).context['page_obj']
+                self.assertEqual(
+                    list(second_page),
+                    list(self.client.get(url + '?page=2')
+                         .context['page_obj'])
+                )
+                self.assertFalse(second_page.has_next())
+                back_page = self.client.get(
+                    url + '?cursor=' + second_page.previous_cursor
+                ).context['page_obj']
+                self.assertEqual(list(back_page), list(first_page))
+                self.assertFalse(back_page.has_previous())
+                broken_page = self.client.get(
+                    url + '?cursor=broken'
+                ).context['page_obj']
+                self.assertEqual(broken_page.number, 1)
+
+    def test_feed_count_is_cached_until_new_post(self):
+        """Число постов ленты берётся из кеша и сбрасывается
+        при публикации нового поста"""
+        def count():
+            feed = versioned_feed((group_feed(self.group.slug),))
+            return FeedPaginator(self.group.posts.all(), 10, feed=feed).count
+
+        count()
+        with self.assertNumQueries(0):
+            self.assertEqual(count(), 13)
+        Post.objects.create(
+            text='Новый пост', author=self.author, group=self.group
+        )
+        self.assertEqual(count(), 14)
+
+    def test_page_links_are_limited_to_window(self):
+        """Паджинатор выводит только окно номеров страниц"""
+        paginator = FeedPaginator(self.group.posts.all(), 1)
+        page = paginator.get_page(7)
+        self.assertEqual(
+            list(page.page_window),
+            list(range(7 - PAGINATOR_WINDOW, 7 + PAGINATOR_WINDOW + 1))
+        )
+
+    def test_feeds_show_preview_without_loading_text(self):
+        """Ленты показывают сохранённое начало поста и не читают
+        полный текст из базы"""
+        post = Post.objects.create(
+            text='Начало. ' + 'хвост ' * POST_PREVIEW_LENGTH,
+            author=self.author,
+            group=self.group
+        )
+        self.assertLessEqual(len(post.preview), POST_PREVIEW_LENGTH)
+        self.assertTrue(post.preview.endswith(' хвост…'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.preview)
+        self.assertNotContains(response, post.text)
+        self.assertFalse(any(
+            '"posts_post"."text"' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_comments_are_loaded_by_cursor(self):
+        """Страница поста показывает последние комментарии, а более
+        ранние подгружаются фрагментом по курсору"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 3)
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        url = reverse('posts:post_comments', args=[post.pk])
+        self.assertContains(
+            response, f'{url}?cursor={response.context["comments_cursor"]}'
+        )
+        with self.assertNumQueries(2):
+            fragment = self.client.get(
+                url, {'cursor': response.context['comments_cursor']}
+            )
+        older = fragment.context['comments']
+        self.assertEqual(len(older), 3)
+        self.assertIsNone(fragment.context['comments_cursor'])
+        self.assertEqual(
+            [comment.pk for comment in comments + older],
+            list(post.comments.order_by('-created', '-pk').values_list(
+                'pk', flat=True
+            ))
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:post_comments', args=[0])
+            ).status_code,
+            404
+        )
+
 
 class CacheViewsTests(TestCase):
     @classmethod
@@ -254,6 +495,186 @@ class CacheViewsTests(TestCase):
                          response_after_clear.content.decode('utf-8'))
         self.assertNotEqual(response_before_clear, response_after_clear)
 
+    def test_feed_cache_is_invalidated_by_new_post(self):
+        """Закешированные ленты обновляются сразу после публикации"""
+        group = Group.objects.create(
+            title='Тестовое название',
+            slug='cached-group',
+            description='Тестовое описание'
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.authorized_user.username}),
+        )
+        for url in urls:
+            self.authorized_user_client.get(url)
+        hits = cache_stats()['hit']
+        for url in urls:
+            self.authorized_user_client.get(url)
+        self.assertEqual(cache_stats()['hit'], hits + len(urls))
+        post = Post.objects.create(
+            text='Свежий пост',
+            author=self.authorized_user,
+            group=group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.authorized_user_client.get(url), post.text
+                )
+
+    def test_feed_cache_follows_renames_and_comments(self):
+        """Переименование автора и группы и новый комментарий
+        обновляют закешированные ленты"""
+        writer = User.objects.create_user(username='writer')
+        group = Group.objects.create(
+            title='Старое название',
+            slug='old-slug',
+            description='Тестовое описание'
+        )
+        post = Post.objects.create(text='Пост', author=writer, group=group)
+        index_url = reverse('posts:index')
+        self.authorized_user_client.get(index_url)
+        self.authorized_user_client.get(
+            reverse('posts:profile', kwargs={'username': 'user'})
+        )
+        writer.username = 'renamed'
+        writer.save()
+        group.title, group.slug = 'Новое название', 'new-slug'
+        group.save()
+        response = self.authorized_user_client.get(index_url)
+        self.assertContains(response, 'Автор: renamed')
+        self.assertContains(response, '/group/new-slug/')
+        self.assertContains(
+            self.authorized_user_client.get(
+                reverse('posts:group_list', kwargs={'slug': 'new-slug'})
+            ),
+            'Новое название'
+        )
+        Comment.objects.create(
+            post=post, author=self.authorized_user, text='Коммент'
+        )
+        self.assertContains(
+            self.authorized_user_client.get(
+                reverse('posts:profile', kwargs={'username': 'user'})
+            ),
+            'комментариев: 1'
+        )
+
+    def test_stale_page_is_served_while_another_request_rebuilds(self):
+        """Пока страницу пересчитывает другой запрос,
+        отдаётся прежняя копия"""
+        url = reverse('posts:index')
+        self.authorized_user_client.get(url)
+        post = Post.objects.create(
+            text='Свежий пост',
+            author=self.authorized_user
+        )
+        with mock.patch('posts.caching.acquire_lock', return_value=None):
+            stale_response = self.authorized_user_client.get(url)
+        self.assertNotContains(stale_response, post.text)
+        self.assertContains(self.authorized_user_client.get(url), post.text)
+
+    def test_timed_out_wait_keeps_foreign_lock(self):
+        """Не дождавшийся страницы запрос считает её сам
+        и не снимает блокировку другого запроса"""
+        url = reverse('posts:index') + '?page=7'
+        key = page_cache_key(RequestFactory().get(url), (INDEX_FEED,))
+        cache.add(lock_key(key), 'foreign')
+        with mock.patch('posts.caching.wait_for_entry', return_value=None):
+            response = self.authorized_user_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.get(lock_key(key)), 'foreign')
+
+    def test_post_cards_are_cached_until_post_changes(self):
+        """Карточки постов берутся из кеша, пока пост не изменён"""
+        post = Post.objects.create(
+            text='Тестовый текст',
+            author=self.authorized_user
+        )
+        posts = list(Post.objects.select_related('author'))
+        render_cards(posts)
+        with self.assertNumQueries(0):
+            (_, card), = render_cards(posts)
+        self.assertIn(post.text, card)
+        post.text = 'Новый текст'
+        post.save()
+        (_, card), = render_cards([post])
+        self.assertIn('Новый текст', card)
+
+    def test_one_cached_page_serves_guests_and_users(self):
+        """Одна копия страницы в кеше, шапка и кнопки — свои
+        у каждого посетителя"""
+        url = reverse('posts:profile',
+                      kwargs={'username': self.authorized_user.username})
+        reader = User.objects.create_user(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        Follow.objects.create(user=reader, author=self.authorized_user)
+        guest_response = Client().get(url)
+        hits = cache_stats()['hit']
+        reader_response = reader_client.get(url)
+        author_response = self.authorized_user_client.get(url)
+        self.assertEqual(cache_stats()['hit'], hits + 2)
+        self.assertContains(guest_response, 'Войти')
+        self.assertContains(guest_response, 'Подписаться')
+        self.assertContains(reader_response, 'Отписаться')
+        self.assertContains(reader_response, 'Выйти')
+        self.assertNotContains(author_response, 'Подписаться')
+        for response in (guest_response, reader_response, author_response):
+            self.assertNotContains(response, '<!--hole:')
+
+    def test_unchanged_feed_answers_not_modified(self):
+        """Неизменившаяся лента отдаёт 304 без рендера шаблона"""
+        url = reverse('posts:index')
+        guest_client = Client()
+        etag = guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(
+            self.authorized_user_client.get(url)['ETag'], etag
+        )
+        Post.objects.create(text='Свежий пост', author=self.authorized_user)
+        self.assertContains(
+            guest_client.get(url, HTTP_IF_NONE_MATCH=etag), 'Свежий пост'
+        )
+
+    def test_trending_block_changes_tag_page_validators(self):
+        """Новый состав популярных тегов не даёт странице тега
+        ответить 304 со старым блоком"""
+        Post.objects.create(text='Пост #кот', author=self.authorized_user)
+        url = reverse('posts:tag_posts', kwargs={'name': 'кот'})
+        guest_client = Client()
+        etag = guest_client.get(url)['ETag']
+        self.assertEqual(
+            guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        Post.objects.create(text='Пост #пёс', author=self.authorized_user)
+        cache.delete(TRENDING_KEY)
+        self.assertContains(
+            guest_client.get(url, HTTP_IF_NONE_MATCH=etag), '#пёс'
+        )
+
+    def test_post_detail_validators_follow_comments(self):
+        """Страница поста отдаёт 304, пока нет новых комментариев"""
+        post = Post.objects.create(
+            text='Тестовый текст',
+            author=self.authorized_user
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        guest_client = Client()
+        etag = guest_client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        post.comments.create(author=self.authorized_user, text='Коммент')
+        self.assertContains(
+            guest_client.get(url, HTTP_IF_NONE_MATCH=etag), 'Коммент'
+        )
+
 
 class FollowServiceTests(TestCase):
     @classmethod
@@ -0,0 +1,199 @@
+import logging
+import os
+from collections import defaultdict
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from .caching import invalidate
+from .constants import (POST_IMAGE_FORMATS, POST_IMAGE_GEOMETRY,
+                        POST_IMAGE_OPTIONS, POST_IMAGE_QUALITY,
+                        POST_IMAGE_WIDTHS)
+from .feeds import feeds_of_post
+from .models import ImageVariant, MediaBlob, Post
+from .objects import forget
+
+logger = logging.getLogger(__name__)
+
+# Ошибки чтения и декодирования картинки; остальные — ошибки кода,
+# их воркер не прячет.
+IMAGE_ERRORS = (OSError, Image.DecompressionBombError)
+# Pillow отвечает ValueError на параметры, которые кодек не принимает.
+ENCODE_ERRORS = (*IMAGE_ERRORS, ValueError)
+
+
+def pending_posts():
+    """Очередь воркера: посты с картинкой, но без готовой миниатюры.
+
+    Условие совпадает с частичным индексом posts_post_pending_thumb_idx.
+    """
+    return Post.objects.filter(
+        thumbnail='', thumbnail_failed=False
+    ).exclude(image='')
+
+
+def variant_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые Pillow умеет сохранять."""
+    Image.init()
+    return [
+        image_format for image_format in POST_IMAGE_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def create_variants(post, thumbnail):
+    """Уменьшенные копии миниатюры в современных форматах для srcset.
+
+    Вариант, который не удалось закодировать или записать, пропускается
+    с записью в лог: миниатюра и остальные варианты остаются.
+    """
+    try:
+        with default_storage.open(thumbnail) as source:
+            crop = Image.open(source)
+            crop.load()
+    except IMAGE_ERRORS:
+        logger.exception('Не удалось открыть миниатюру поста %s', post.pk)
+        return
+    if crop.mode not in ('RGB', 'RGBA'):
+        crop = crop.convert('RGBA')
+    stem = os.path.splitext(thumbnail)[0]
+    variants = []
+    for width in POST_IMAGE_WIDTHS:
+        if width > crop.width:
+            continue
+        height = round(crop.height * width / crop.width)
+        resized = crop.resize((width, height), Image.LANCZOS)
+        for image_format in variant_formats():
+            buffer = BytesIO()
+            try:
+                resized.save(buffer, image_format, quality=POST_IMAGE_QUALITY)
+                name = default_storage.save(
+                    f'{stem}_{width}.{image_format.lower()}',
+                    ContentFile(buffer.getvalue())
+                )
+            except ENCODE_ERRORS:
+                logger.exception(
+                    'Не удалось сохранить %s шириной %s для поста %s',
+                    image_format, width, post.pk
+                )
+                continue
+            variants.append(ImageVariant(
+                post=post, format=image_format, width=width, file=name,
+                size=len(buffer.getvalue())
+            ))
+    ImageVariant.objects.filter(post=post).delete()
+    ImageVariant.objects.bulk_create(variants)
+
+
+def variant_savings():
+    """Экономия трафика по форматам и ширинам.
+
+    Для каждой пары (формат, ширина) — число картинок, их объём и объём
+    миниатюр тех же постов, которые отдавались бы вместо них.
+    """
+    thumbnail_sizes = {}
+    report = defaultdict(lambda: {'count': 0, 'bytes': 0, 'baseline': 0})
+    variants = ImageVariant.objects.select_related('post').only(
+        'format', 'width', 'size', 'post__thumbnail'
+    )
+    for variant in variants.iterator():
+        thumbnail = variant.post.thumbnail.name
+        if thumbnail not in thumbnail_sizes:
+            thumbnail_sizes[thumbnail] = default_storage.size(thumbnail)
+        row = report[variant.format, variant.width]
+        row['count'] += 1
+        row['bytes'] += variant.size
+        row['baseline'] += thumbnail_sizes[thumbnail]
+    return dict(sorted(report.items()))
+
+
+def reuse_thumbnail(post):
+    """Миниатюра и варианты поста с той же картинкой, если они готовы.
+
+    Файлы картинок адресуются содержимым, так что одинаковая картинка
+    у разных постов — одно имя и обрабатывается один раз. Счётчик
+    ссылок MediaBlob отсекает поиск двойника, когда картинка есть только
+    у этого поста, — так бывает почти всегда.
+    """
+    refs = MediaBlob.objects.filter(
+        name=post.image.name
+    ).values_list('refs', flat=True).first()
+    if refs is not None and refs < 2:
+        return None
+    twin = Post.objects.filter(image=post.image.name).exclude(
+        pk=post.pk
+    ).exclude(thumbnail='').first()
+    if twin is None:
+        return None
+    ImageVariant.objects.filter(post=post).delete()
+    ImageVariant.objects.bulk_create(
+        ImageVariant(
+            post=post, format=variant.format, width=variant.width,
+            file=variant.file.name, size=variant.size
+        )
+        for variant in twin.image_variants.all()
+    )
+    return twin.thumbnail.name
+
+
+def render_thumbnail(post):
+    """Имя готовой миниатюры; sorl при нечитаемой картинке только пишет
+    в лог и возвращает несуществующий файл — это тоже ошибка."""
+    thumbnail = get_thumbnail(
+        post.image, POST_IMAGE_GEOMETRY, **POST_IMAGE_OPTIONS
+    )
+    if not thumbnail.exists():
+        raise OSError(f'Миниатюра {thumbnail.name} не создана')
+    return thumbnail.name
+
+
+def generate_thumbnail(post):
+    """Рисует миниатюру поста и сбрасывает кеши, где была заглушка.
+
+    Картинку, которую не удалось прочитать, воркер пишет в лог и
+    помечает thumbnail_failed: пост уходит из очереди, а в лентах вместо
+    картинки — пометка. Вернуть такие посты в очередь можно командой
+    process_thumbnails --retry-failed. Возвращает имя миниатюры или None.
+    """
+    thumbnail = reuse_thumbnail(post)
+    if thumbnail is None:
+        try:
+            thumbnail = render_thumbnail(post)
+        except IMAGE_ERRORS:
+            logger.exception(
+                'Не удалось нарисовать миниатюру поста %s', post.pk
+            )
+            thumbnail = None
+        else:
+            create_variants(post, thumbnail)
+    # update() без сигналов; условие по картинке не даёт записать
+    # миниатюру старой картинки, если пост успели отредактировать.
+    Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnail=thumbnail or '',
+        thumbnail_failed=thumbnail is None,
+        updated=timezone.now()
+    )
+    forget(Post, post.pk)
+    invalidate(feeds_of_post(post))
+    return thumbnail
+
+
+def retry_failed():
+    """Возвращает в очередь посты, миниатюры которых не удались."""
+    return Post.objects.filter(thumbnail_failed=True).update(
+        thumbnail_failed=False
+    )
+
+
+def generate_thumbnails(batch_size):
+    """Обрабатывает порцию очереди, возвращает число постов."""
+    posts = list(
+        pending_posts().select_related('author', 'group')[:batch_size]
+    )
+    for post in posts:
+        generate_thumbnail(post)
+    return len(posts)
@@ -0,0 +1,244 @@
+import heapq
+from itertools import islice
+
+from django.db import connections, router
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .constants import TIMELINE_BATCH_SIZE, TIMELINE_LENGTH
+from .models import Follow, Post, PulledAuthor, TimelineEntry
+
+
+class MergedFeed:
+    """Несколько упорядоченных одинаково лент постов, слитых в одну.
+
+    Поддерживает то, что нужно FeedPaginator: filter, order_by, count
+    и срезы. Срез [start:stop] берёт из каждой ленты первые stop постов
+    и сливает их k-путевым слиянием по ключу сортировки.
+    """
+    ordered = True
+
+    def __init__(self, *streams, ordering=('-pub_date', '-pk')):
+        self.streams = streams
+        self.ordering = ordering
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(
+            *(stream.filter(*args, **kwargs) for stream in self.streams),
+            ordering=self.ordering
+        )
+
+    def order_by(self, *fields):
+        return MergedFeed(
+            *(stream.order_by(*fields) for stream in self.streams),
+            ordering=fields
+        )
+
+    def count(self):
+        return sum(stream.count() for stream in self.streams)
+
+    def _key(self, post):
+        return tuple(
+            getattr(post, field.lstrip('-')) for field in self.ordering
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        streams = [
+            stream if stop is None else stream[:stop]
+            for stream in self.streams
+        ]
+        merged = heapq.merge(
+            *streams,
+            key=self._key,
+            reverse=self.ordering[0].startswith('-')
+        )
+        return list(islice(merged, start, stop))
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def entry_lookup(lookup):
+    """Поиск по посту — поиск по строке ленты: pk поста там — post_id."""
+    sign = '-' if lookup.startswith('-') else ''
+    field, separator, rest = lookup.lstrip('-').partition('__')
+    if field == 'pk':
+        field = 'post_id'
+    return f'{sign}{field}{separator}{rest}'
+
+
+def entry_q(q):
+    clone = Q()
+    clone.connector, clone.negated = q.connector, q.negated
+    clone.children = [
+        entry_q(child) if isinstance(child, Q)
+        else (entry_lookup(child[0]), child[1])
+        for child in q.children
+    ]
+    return clone
+
+
+class EntryFeed:
+    """Посты в порядке строк денормализованной таблицы с полями pub_date
+    и post (TimelineEntry, PostTag).
+
+    Фильтр по курсору, сортировка, COUNT(*) и срезы выполняются над
+    строками таблицы по её индексу (..., -pub_date, -post), а карточки
+    постов среза загружаются потом одним запросом по первичным ключам.
+    """
+    ordered = True
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def filter(self, *args, **kwargs):
+        return EntryFeed(self.entries.filter(
+            *map(entry_q, args),
+            **{entry_lookup(key): value for key, value in kwargs.items()}
+        ))
+
+    def order_by(self, *fields):
+        return EntryFeed(self.entries.order_by(*map(entry_lookup, fields)))
+
+    @property
+    def query(self):
+        # Для оценки числа строк по плану (estimate_count).
+        return self.entries.query
+
+    @property
+    def db(self):
+        return self.entries.db
+
+    def count(self):
+        return self.entries.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = list(self.entries.values_list('post_id', flat=True)[index])
+        posts = Post.objects.cards().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def is_pulled(author_id):
+    return PulledAuthor.objects.filter(author_id=author_id).exists()
+
+
+def follow_posts(user):
+    """Лента подписок: разложенные посты плюс посты «тяжёлых» авторов."""
+    pushed = EntryFeed(TimelineEntry.objects.filter(user=user))
+    pulled = Post.objects.cards().filter(
+        author__following__user=user,
+        author__pulled__isnull=False
+    )
+    return MergedFeed(pushed, pulled)
+
+
+def trim_timelines(user_ids):
+    """Оставляет в лентах читателей не больше TIMELINE_LENGTH записей.
+
+    Один DELETE на всех: записи нумеруются внутри ленты каждого читателя
+    оконной функцией по индексу (user, -pub_date, -post), удаляются
+    записи с номером больше TIMELINE_LENGTH. Возвращает число удалённых.
+    """
+    ranked = TimelineEntry.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('pub_date').desc(), F('post_id').desc()]
+        )
+    ).order_by().values('pk', 'position')
+    sql, params = ranked.query.sql_with_params()
+    connection = connections[router.db_for_write(TimelineEntry)]
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM ({sql}) ranked WHERE position > %s)',
+            (*params, TIMELINE_LENGTH)
+        )
+        return cursor.rowcount
+
+
+def long_timelines():
+    """Читатели, чьи ленты выросли больше TIMELINE_LENGTH записей."""
+    return TimelineEntry.objects.order_by().values('user_id').annotate(
+        total=Count('pk')
+    ).filter(total__gt=TIMELINE_LENGTH).values_list('user_id', flat=True)
+
+
+def post_readers(author_id):
+    """Читатели постов автора: (читаются ли они при запросе, подписчики).
+
+    Подписчики авторов из PulledAuthor не нужны: их посты не
+    раскладываются по лентам, — для них список пуст.
+    """
+    if is_pulled(author_id):
+        return True, []
+    return False, list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def push_post(post, readers=None):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Посты авторов из PulledAuthor не раскладываются: их лента подписок
+    читает сама при запросе. Ленты не обрезаются здесь, чтобы не делать
+    DELETE на каждого подписчика: лента читается с начала по индексу, а
+    лишние записи периодически удаляет команда trim_timelines.
+
+    readers — уже найденный post_readers автора, чтобы не искать заново.
+    """
+    pulled, followers = readers or post_readers(post.author_id)
+    if pulled:
+        return
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date', '-pk').values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts[:TIMELINE_LENGTH]),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim_timelines([user_id])
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def set_pulled(author_id, pulled):
+    """Переводит автора между раздачей при записи и чтением при запросе."""
+    if pulled:
+        PulledAuthor.objects.get_or_create(author_id=author_id)
+        TimelineEntry.objects.filter(post__author_id=author_id).delete()
+        return
+    PulledAuthor.objects.filter(author_id=author_id).delete()
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for user_id in followers.iterator():
+        backfill_timeline(user_id, author_id)
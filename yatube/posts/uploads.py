@@ -0,0 +1,92 @@
+import os
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+from .constants import (POST_IMAGE_JPEG_QUALITY, POST_IMAGE_MAX_BYTES,
+                        POST_IMAGE_MAX_PIXELS, POST_IMAGE_MAX_SIDE)
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, но не больше POST_IMAGE_MAX_BYTES.
+
+    Остаток слишком большого файла читается из запроса и отбрасывается,
+    а файл помечается oversized — форма отклонит его с понятной ошибкой.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= POST_IMAGE_MAX_BYTES:
+            super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.oversized = self.received > POST_IMAGE_MAX_BYTES
+        return upload
+
+
+def check_upload_size(upload):
+    """Отклоняет файл больше POST_IMAGE_MAX_BYTES, в том числе обрезанный
+    BoundedUploadHandler, — до того как его откроет Pillow."""
+    if getattr(upload, 'oversized', False) or (
+        upload is not None and upload.size > POST_IMAGE_MAX_BYTES
+    ):
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': POST_IMAGE_MAX_BYTES // (1024 * 1024)},
+            code='file_too_large'
+        )
+
+
+def prepare_image(upload):
+    """Проверяет загруженную картинку и при необходимости уменьшает её.
+
+    Размер в пикселях читается из заголовка, до декодирования. Картинки
+    больше POST_IMAGE_MAX_SIDE по длинной стороне декодируются сразу
+    с уменьшением (draft) и пересохраняются в JPEG или, если есть
+    прозрачность, в PNG; остальные сохраняются как есть.
+    """
+    if not isinstance(upload, UploadedFile):
+        return upload
+    check_upload_size(upload)
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей.',
+            params={'limit': POST_IMAGE_MAX_PIXELS // 1000000},
+            code='too_many_pixels'
+        )
+    if max(width, height) <= POST_IMAGE_MAX_SIDE:
+        upload.seek(0)
+        return upload
+    image.draft('RGB', (POST_IMAGE_MAX_SIDE, POST_IMAGE_MAX_SIDE))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((POST_IMAGE_MAX_SIDE, POST_IMAGE_MAX_SIDE), Image.LANCZOS)
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image_format, extension, options = 'PNG', 'png', {'optimize': True}
+        image = image.convert('RGBA')
+    else:
+        image_format, extension, options = 'JPEG', 'jpg', {
+            'quality': POST_IMAGE_JPEG_QUALITY,
+            'optimize': True,
+            'progressive': True,
+        }
+        image = image.convert('RGB')
+    # Уменьшенная копия не больше POST_IMAGE_MAX_SIDE в каждую сторону —
+    # её можно держать в памяти.
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return SimpleUploadedFile(
+        f'{os.path.splitext(upload.name)[0]}.{extension}',
+        buffer.getvalue(),
+        content_type=f'image/{image_format.lower()}'
+    )
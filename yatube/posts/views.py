@@ -1,23 +1,41 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db.models import prefetch_related_objects
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
-from .constants import NUMBER_OF_SECONDS, POSTS_PER_PAGE
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
 
+from core.db_routers import primary_reads
+from core.query_budget import query_budget
 
-def get_page(request, post_list):
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
+from .caching import cache_feed, post_state, post_validators, versioned_feed
+from .constants import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+from .feeds import (INDEX_FEED, follow_feeds, group_feed, profile_feed,
+                    tag_feed)
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post, PostTag, Tag, User
+from .objects import get_cached_or_404
+from .paginators import FeedPaginator, WindowPaginator, older_rows
+from .search import SearchResults
+from .tags import trending_feeds
+from .timelines import EntryFeed, follow_posts
+
+
+def get_page(request, post_list, feeds=()):
+    feed = versioned_feed(feeds) if feeds else None
+    paginator = FeedPaginator(post_list, POSTS_PER_PAGE, feed=feed)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_page_by_cursor(cursor)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
-@cache_page(NUMBER_OF_SECONDS, key_prefix='index_page')
+@query_budget(6)
+@cache_feed(lambda request: (INDEX_FEED,))
 def index(request):
-    post_list = Post.objects.select_related('group')
-    page_obj = get_page(request, post_list)
+    post_list = Post.objects.cards()
+    page_obj = get_page(request, post_list, (INDEX_FEED,))
     template = 'posts/index.html'
     title = 'Последние обновления на сайте'
     context = {
@@ -27,10 +45,12 @@ def index(request):
     return render(request, template, context)
 
 
+@query_budget(6)
+@cache_feed(lambda request, slug: (group_feed(slug),))
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = get_page(request, post_list)
+    group = get_cached_or_404(Group, slug)
+    post_list = group.posts.cards()
+    page_obj = get_page(request, post_list, (group_feed(slug),))
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -38,37 +58,84 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(7)
+@cache_feed(lambda request, name: (tag_feed(name),),
+            holes_for=trending_feeds)
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=name.lower())
+    post_list = EntryFeed(PostTag.objects.filter(tag=tag))
+    page_obj = get_page(request, post_list, (tag_feed(name),))
+    context = {
+        'page_obj': page_obj,
+        'tag': tag,
+    }
+    return render(request, 'posts/tag_list.html', context)
+
+
+@query_budget(7)
+@cache_feed(lambda request, username: (profile_feed(username),))
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = get_page(request, post_list)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author).exists()
-    else:
-        following = None
+    author = get_cached_or_404(User, username)
+    post_list = author.posts.cards()
+    page_obj = get_page(request, post_list, (profile_feed(username),))
     context = {
         'page_obj': page_obj,
         'author': author,
-        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(6)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    if query:
+        paginator = WindowPaginator(SearchResults(query), POSTS_PER_PAGE)
+        context['page_obj'] = paginator.get_page(request.GET.get('page'))
+        context['query_string'] = urlencode({'q': query}) + '&'
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(7)
+@post_validators
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_cached_or_404(Post, post_id)
+    prefetch_related_objects([post], 'image_variants')
     author = post.author
     comment_form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments, comments_cursor = older_rows(
+        post.comments.select_related('author'), None, COMMENTS_PER_PAGE
+    )
     context = {
         'comment_form': comment_form,
         'comments': comments,
+        'comments_cursor': comments_cursor,
         'post': post,
         'author': author
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(4)
+@post_validators
+def post_comments(request, post_id):
+    """Фрагмент с комментариями старше курсора — для подгрузки."""
+    if post_state(request, post_id) is None:
+        raise Http404
+    comments, comments_cursor = older_rows(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        request.GET.get('cursor'),
+        COMMENTS_PER_PAGE
+    )
+    context = {
+        'comments': comments,
+        'comments_cursor': comments_cursor,
+        'post_id': post_id,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(23)
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -87,9 +154,15 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(24)
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    # Правка пишет всю строку: читаем её из основной базы, а не из
+    # кеша объектов или отстающей реплики.
+    with primary_reads():
+        post = get_object_or_404(
+            Post.objects.select_related('author', 'group'), pk=post_id
+        )
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
 
@@ -110,9 +183,10 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(8)
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_cached_or_404(Post, post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -122,11 +196,13 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(8)
 @login_required
+@cache_feed(lambda request: follow_feeds(request.user.pk))
 def follow_index(request):
     title = 'Посты авторов, на которых вы подписаны'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page(request, post_list)
+    post_list = follow_posts(request.user)
+    page_obj = get_page(request, post_list, follow_feeds(request.user.pk))
     context = {
         'page_obj': page_obj,
         'title': title,
@@ -134,18 +210,23 @@ def follow_index(request):
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(13)
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_or_404(User, username)
     if request.user != author:
         Follow.objects.get_or_create(
             user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
 
+@query_budget(8)
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.filter(user=request.user, author=author).delete()
+    author = get_cached_or_404(User, username)
+    follow = Follow.objects.filter(user=request.user, author=author).first()
+    if follow is not None:
+        # Сигналу нужны имена обоих: они уже загружены.
+        follow.user, follow.author = request.user, author
+        follow.delete()
     return redirect('posts:profile', username=username)
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from core.db_routers import primary_reads
+
+USER_CACHE_TIMEOUT = 60 * 60
+STATS_KEYS = ('requests', 'saved')
+
+
+def user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def stats_key(name):
+    return f'auth-cache-stats:{name}'
+
+
+def count(name, delta):
+    key = stats_key(name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def auth_cache_stats():
+    """Запросы с входом и сэкономленные на них SQL-запросы."""
+    found = cache.get_many([stats_key(name) for name in STATS_KEYS])
+    return {name: found.get(stats_key(name), 0) for name in STATS_KEYS}
+
+
+def forget_user(user_id):
+    cache.delete(user_key(user_id))
+
+
+def record_savings(request, user_cached):
+    """Каждый запрос с входом экономит по запросу на сессию и на
+    пользователя, если они нашлись в кеше."""
+    saved = int(user_cached) + int(getattr(request.session, 'from_cache', 0))
+    request.auth_queries_saved = saved
+    count('requests', 1)
+    if saved:
+        count('saved', saved)
+
+
+def get_cached_user(request):
+    """Пользователь сессии, по возможности без запроса к базе.
+
+    Проверки те же, что у django.contrib.auth.get_user: бэкенд из
+    настроек и хеш сессии, который меняется вместе с паролем.
+    """
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if user_id is None:
+        return auth.get_user(request)
+    user = None
+    backend = session.get(auth.BACKEND_SESSION_KEY)
+    if backend in settings.AUTHENTICATION_BACKENDS:
+        user = cache.get(user_key(user_id))
+    if user is None:
+        with primary_reads():
+            user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(user_key(user.pk), user, USER_CACHE_TIMEOUT)
+            record_savings(request, False)
+        return user
+    if not constant_time_compare(
+        session.get(auth.HASH_SESSION_KEY, ''), user.get_session_auth_hash()
+    ):
+        session.flush()
+        return AnonymousUser()
+    record_savings(request, True)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, который берёт пользователя из кеша.
+
+    Записи сбрасываются сигналами users.signals: при любом сохранении
+    пользователя (смена и сброс пароля в том числе), удалении и выходе.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from users.auth import auth_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько SQL-запросов на сессию и пользователя '
+        'сэкономил кеш на запросах с входом.'
+    )
+
+    def handle(self, *args, **options):
+        stats = auth_cache_stats()
+        requests = stats['requests']
+        average = stats['saved'] / requests if requests else 0
+        self.stdout.write(
+            f'Запросов с входом: {requests}, сэкономлено SQL-запросов: '
+            f'{stats["saved"]} (в среднем {average:.2f} из 2 на запрос).'
+        )
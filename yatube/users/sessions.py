@@ -0,0 +1,18 @@
+from django.contrib.sessions.backends.cached_db import \
+    SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    """Сессии в кеше с записью в базу (cached_db), которые помнят,
+    удалось ли обойтись без запроса к базе."""
+    from_cache = False
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            data = None
+        if data is not None:
+            self.from_cache = True
+            return data
+        return super().load()
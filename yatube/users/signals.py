@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import forget_user
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields, **kwargs):
+    # Вход меняет только last_login: хеш сессии от него не зависит.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def user_logged_out_forget(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
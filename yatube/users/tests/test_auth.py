@@ -0,0 +1,48 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..auth import user_key
+
+User = get_user_model()
+
+
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='old-password'
+        )
+        self.client.login(username='reader', password='old-password')
+        self.url = reverse('about:author')
+
+    def test_session_and_user_come_from_cache(self):
+        """Сессия и пользователь берутся из кеша, экономия видна
+        в статистике"""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['user'], self.user)
+        self.assertEqual(response.wsgi_request.auth_queries_saved, 2)
+        out = StringIO()
+        call_command('auth_cache_stats', stdout=out)
+        self.assertIn('Запросов с входом: 2', out.getvalue())
+
+    def test_password_change_and_logout_reset_cached_user(self):
+        """Смена пароля завершает прежние сессии, выход сбрасывает
+        пользователя из кеша"""
+        self.client.get(self.url)
+        self.user.set_password('new-password')
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+        self.client.login(username='reader', password='new-password')
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(user_key(self.user.pk)))
+        self.client.logout()
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
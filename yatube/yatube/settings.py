@@ -14,6 +14,7 @@ from dotenv import load_dotenv
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
 import os
+import tempfile
 
 load_dotenv()
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -49,10 +50,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
+    'core.db_routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -143,11 +146,45 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся во временный файл не длиннее POST_IMAGE_MAX_BYTES.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedUploadHandler']
+
+# Сессии и пользователи сессий читаются из кеша, база — запасной путь.
+SESSION_ENGINE = 'users.sessions'
+
+# Превышение бюджета SQL-запросов (@query_budget) пишется в лог;
+# с True — поднимает исключение, если запрос к сайту ничего не записал.
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT') == '1'
+# Без DEBUG запросы считаются только у такой доли запросов к сайту.
+QUERY_BUDGET_SAMPLE = float(os.getenv('QUERY_BUDGET_SAMPLE', '0'))
+
+# Первый уровень кеша живёт в памяти процесса, второй общий для всех
+# воркеров. По умолчанию это файловый кеш во временном каталоге — общий
+# для воркеров одного узла; для нескольких узлов задайте CACHE_L2_BACKEND
+# (например, memcached) и CACHE_L2_LOCATION. Кеш в памяти процесса
+# вторым уровнем быть не может: проверка core.E001 не даст запуститься.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'MAX_BYTES': 32 * 1024 * 1024,
+            'L1_TIMEOUT': 60,
+            'STAMP_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube-cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
+if os.getenv('CACHE_L2_BACKEND'):
+    CACHES['shared'] = {
+        'BACKEND': os.getenv('CACHE_L2_BACKEND'),
+        'LOCATION': os.getenv('CACHE_L2_LOCATION'),
+    }
 
 
 
@@ -160,7 +197,27 @@ DATABASES = {
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT')
     }
-} 
+}
+
+# Реплики для чтения: DB_REPLICAS — хосты через запятую (для SQLite —
+# файлы баз). Запросы посетителя, который только что что-то записал,
+# DATABASE_REPLICA_LAG секунд читают из основной базы.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    alias = f'replica_{number}'
+    field = 'NAME' if DATABASES['default']['ENGINE'].endswith(
+        'sqlite3'
+    ) else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        field: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+DATABASE_REPLICA_LAG = int(os.getenv('DB_REPLICA_LAG', 5))
 
 
 sentry_sdk.init(